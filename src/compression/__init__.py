@@ -0,0 +1 @@
+"""The package responsible for compression of the responses."""
@@ -0,0 +1,120 @@
+"""
+The module responsible for the supported content codings and their negotiation.
+
+Every compressor works on a stream: each chunk passed to it is flushed,
+so the chunks of a streaming response reach the client without waiting
+for the end of the response.
+"""
+
+import zlib
+from typing import Dict, Optional, Tuple
+
+import brotli
+import zstandard
+
+GZIP: str = "gzip"
+BROTLI: str = "br"
+ZSTD: str = "zstd"
+IDENTITY: str = "identity"
+
+# In the order of preference of the server.
+ENCODINGS: Tuple[str, ...] = (ZSTD, BROTLI, GZIP)
+
+# The levels are chosen for the responses compressed on the fly, the highest
+# levels of brotli and zstd are too slow for them.
+GZIP_LEVEL: int = 6
+BROTLI_QUALITY: int = 4
+ZSTD_LEVEL: int = 3
+
+
+def _parse_accept_encoding(accept_encoding: str) -> Dict[str, float]:
+    """Return the quality values of the codings of the Accept-Encoding header."""
+    qualities: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        if not coding:
+            continue
+
+        quality: float = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Choose the coding of the response by the Accept-Encoding header.
+
+    Return None if the response should not be compressed: the header is
+    missing, only identity is accepted, or none of the codings is acceptable.
+    Codings with the same quality are chosen in the order of ENCODINGS.
+    """
+    if not accept_encoding:
+        return None
+
+    qualities: Dict[str, float] = _parse_accept_encoding(accept_encoding)
+    default: float = qualities.get("*", 0.0)
+    best: Optional[str] = None
+    best_quality: float = 0.0
+    for encoding in ENCODINGS:
+        quality: float = qualities.get(encoding, default)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+
+    if best is not None and qualities.get(IDENTITY, 0.0) > best_quality:
+        return None
+    return best
+
+
+class Compressor(object):
+    """
+    Compresses a stream of chunks with the content coding.
+
+    Args:
+        encoding (str) - the coding, one of ENCODINGS.
+    """
+
+    def __init__(self, encoding: str):
+        """Initialize class."""
+        self.encoding = encoding
+        if encoding == GZIP:
+            self._gzip = zlib.compressobj(
+                GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+            )
+        elif encoding == BROTLI:
+            self._brotli = brotli.Compressor(
+                mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY
+            )
+        elif encoding == ZSTD:
+            self._zstd = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"Unsupported content coding {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress the chunk and flush it."""
+        if self.encoding == GZIP:
+            return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+        elif self.encoding == BROTLI:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zstd.compress(data) + self._zstd.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self, data: bytes = b"") -> bytes:
+        """Compress the last chunk and end the stream."""
+        if self.encoding == GZIP:
+            return self._gzip.compress(data) + self._gzip.flush()
+        elif self.encoding == BROTLI:
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zstd.compress(data) + self._zstd.flush()
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress the whole body with the content coding."""
+    return Compressor(encoding).finish(data)
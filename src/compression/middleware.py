@@ -0,0 +1,233 @@
+"""The module responsible for the middleware of compression of the responses."""
+
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, MutableMapping, Optional, Tuple
+
+from src.config.app_config import Compression
+
+from .codecs import Compressor, compress, negotiate
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+Headers = List[Tuple[bytes, bytes]]
+
+# The path with the query string, the media type and the coding of the response.
+CacheKey = Tuple[str, bytes, bytes, str]
+
+
+class CompressedCache(object):
+    """
+    LRU cache of the compressed bodies of the responses.
+
+    The body is stored with the digest of the uncompressed one, which serves
+    as the version of the data: while the data behind the query is not
+    changed, the app returns the same body, and its compressed form
+    is taken from the cache. Hashing the body is much cheaper
+    than compressing it again, and it does not depend on the storage backend
+    or on the process which changed the data.
+
+    Args:
+        size (int) - the maximum number of the bodies (0 - the cache is disabled).
+        max_bytes (int) - the maximum total size of the compressed bodies.
+    """
+
+    def __init__(self, size: int, max_bytes: int):
+        """Initialize class."""
+        self.size = size
+        self.max_bytes = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        self._bodies: OrderedDict[CacheKey, Tuple[bytes, bytes]] = OrderedDict()
+        self._bytes: int = 0
+
+    @staticmethod
+    def digest(body: bytes) -> bytes:
+        """Return the digest of the uncompressed body."""
+        return hashlib.blake2b(body, digest_size=16).digest()
+
+    def get(self, key: CacheKey, digest: bytes) -> Optional[bytes]:
+        """Return the compressed body if it was compressed from the same body."""
+        entry: Optional[Tuple[bytes, bytes]] = self._bodies.get(key)
+        if entry is None or entry[0] != digest:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._bodies.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: CacheKey, digest: bytes, body: bytes) -> None:
+        """Save the compressed body, evicting the least recently used ones."""
+        if self.size <= 0 or len(body) > self.max_bytes:
+            return
+
+        old: Optional[Tuple[bytes, bytes]] = self._bodies.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old[1])
+        self._bodies[key] = (digest, body)
+        self._bytes += len(body)
+        while len(self._bodies) > self.size or self._bytes > self.max_bytes:
+            _, (_, evicted) = self._bodies.popitem(last=False)
+            self._bytes -= len(evicted)
+
+
+class CompressionMiddleware(object):
+    """
+    Compresses the responses with gzip, brotli or zstd chosen by Accept-Encoding.
+
+    A response whose whole body is sent at once is compressed only if it is
+    not smaller than the minimum size. Successful responses to GET requests
+    are compressed through the cache (see CompressedCache). The chunks
+    of streaming responses are compressed and sent as they come.
+    Responses which already have Content-Encoding are sent as they are.
+    """
+
+    def __init__(self, app: ASGIApp, config: Compression):
+        """Initialize class."""
+        self.app = app
+        self.config = config
+        self.cache = CompressedCache(config.cache_size, config.cache_max_bytes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Run the request and compress its response if the client accepts it."""
+        if scope["type"] != "http" or not self.config.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding: Optional[str] = None
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        encoding: Optional[str] = negotiate(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressedResponder(self, scope, encoding, send)(receive)
+
+
+class _CompressedResponder(object):
+    """Compresses the response of one request."""
+
+    def __init__(
+        self,
+        middleware: CompressionMiddleware,
+        scope: Scope,
+        encoding: str,
+        send: Send,
+    ):
+        """Initialize class."""
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self.send = send
+        self.start: Optional[Message] = None
+        self.passthrough: bool = False
+        self.compressor: Optional[Compressor] = None
+
+    async def __call__(self, receive: Receive) -> None:
+        """Run the app with the compressing send."""
+        await self.middleware.app(self.scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        """Hold the start of the response until it is known how to send the body."""
+        if self.passthrough:
+            await self.send(message)
+        elif message["type"] == "http.response.start":
+            headers: Headers = list(message.get("headers", []))
+            if any(name == b"content-encoding" for name, _ in headers):
+                self.passthrough = True
+                await self.send(message)
+            else:
+                self.start = message
+        elif message["type"] == "http.response.body" and self.compressor is None:
+            await self._send_first(message)
+        elif message["type"] == "http.response.body" and self.compressor is not None:
+            body: bytes = message.get("body", b"")
+            more_body: bool = message.get("more_body", False)
+            if more_body:
+                chunk: bytes = self.compressor.compress(body)
+            else:
+                chunk = self.compressor.finish(body)
+            if chunk or not more_body:
+                await self.send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": more_body,
+                    }
+                )
+        else:
+            await self.send(message)
+
+    async def _send_first(self, message: Message) -> None:
+        """Send the start and the first chunk of the body (compressed if needed)."""
+        assert self.start is not None
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+
+        if not more_body:
+            self.passthrough = True
+            if len(body) < self.middleware.config.minimum_size:
+                await self.send(self.start)
+                await self.send(message)
+                return
+
+            compressed: bytes = self._compress_body(body)
+            self._set_headers(len(compressed))
+            await self.send(self.start)
+            await self.send({"type": "http.response.body", "body": compressed})
+            return
+
+        self.compressor = Compressor(self.encoding)
+        self._set_headers(None)
+        await self.send(self.start)
+        await self.send(
+            {
+                "type": "http.response.body",
+                "body": self.compressor.compress(body),
+                "more_body": True,
+            }
+        )
+
+    def _compress_body(self, body: bytes) -> bytes:
+        """Compress the whole body (through the cache if the response is cacheable)."""
+        assert self.start is not None
+        if self.scope["method"] != "GET" or self.start["status"] != 200:
+            return compress(body, self.encoding)
+
+        content_type: bytes = b""
+        for name, value in self.start.get("headers", []):
+            if name == b"content-type":
+                content_type = value
+        query: bytes = self.scope.get("query_string", b"")
+        key: CacheKey = (self.scope["path"], query, content_type, self.encoding)
+        cache: CompressedCache = self.middleware.cache
+        digest: bytes = cache.digest(body)
+
+        compressed: Optional[bytes] = cache.get(key, digest)
+        if compressed is None:
+            compressed = compress(body, self.encoding)
+            cache.put(key, digest, compressed)
+        return compressed
+
+    def _set_headers(self, content_length: Optional[int]) -> None:
+        """Set Content-Encoding, Vary and the length of the compressed body."""
+        assert self.start is not None
+        headers: Headers = [
+            (name, value)
+            for name, value in self.start.get("headers", [])
+            if name != b"content-length"
+        ]
+        vary: List[bytes] = [value for name, value in headers if name == b"vary"]
+        headers = [(name, value) for name, value in headers if name != b"vary"]
+        vary.append(b"Accept-Encoding")
+        headers.append((b"vary", b", ".join(vary)))
+        headers.append((b"content-encoding", self.encoding.encode()))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+        self.start["headers"] = headers
@@ -2,6 +2,7 @@
 
 import os
 from dataclasses import dataclass, field
+from typing import List
 
 import dotenv
 
@@ -18,11 +19,20 @@ class DB(object):
     port: str = os.getenv("POSTGRES_PORT", "5432")
     db_name: str = os.getenv("POSTGRES_DB", "db")
     url: str = os.getenv("POSTGRES_URL", "")
+    shard_urls: List[str] = field(default_factory=list)
 
     def __init__(self):
-        """Initialize the class."""
+        """
+        Initialize the class.
+
+        The tasks are spread over the databases of POSTGRES_SHARD_URLS
+        (comma separated), the first of them is the main one (the jobs are
+        stored there). Without it, the database of url is the only shard.
+        """
+        shard_urls: str = os.getenv("POSTGRES_SHARD_URLS", "")
         if os.getenv("DEBUG", "0") == "1":
             self.url = os.getenv("POSTGRES_TEST_URL", "")
+            shard_urls = os.getenv("POSTGRES_TEST_SHARD_URLS", "")
 
         if self.url == "":
             self.url = (
@@ -30,6 +40,73 @@ class DB(object):
                 f"@{self.host}:{self.port}/{self.db_name}"
             )
 
+        self.shard_urls = [url.strip() for url in shard_urls.split(",") if url.strip()]
+        if not self.shard_urls:
+            self.shard_urls = [self.url]
+
+
+@dataclass
+class Archive(object):
+    """Config class for moving done tasks to the archive."""
+
+    enabled: bool = os.getenv("ARCHIVE_ENABLED", "0") == "1"
+    age_days: int = int(os.getenv("ARCHIVE_AGE_DAYS", "30"))
+    batch_size: int = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+    interval: int = int(os.getenv("ARCHIVE_INTERVAL", "60"))
+
+
+@dataclass
+class Jobs(object):
+    """Config class for the background import and export jobs."""
+
+    workers: int = int(os.getenv("JOBS_WORKERS", "2"))
+    directory: str = os.getenv("JOBS_DIR", "jobs")
+    batch_size: int = int(os.getenv("JOBS_BATCH_SIZE", "10000"))
+    stale_after: int = int(os.getenv("JOBS_STALE_AFTER", "600"))
+
+
+@dataclass
+class Profiling(object):
+    """Config class for profiling of the requests and budgets of SQL statements."""
+
+    enabled: bool = os.getenv("PROFILING_ENABLED", "0") == "1"
+    token: str = os.getenv("PROFILING_TOKEN", "")
+    directory: str = os.getenv("PROFILING_DIR", "profiles")
+    sql_budget: int = int(os.getenv("SQL_BUDGET", "0"))
+    sql_budget_mode: str = os.getenv("SQL_BUDGET_MODE", "warn")
+
+    def __post_init__(self):
+        """
+        Check the mode of the budget of SQL statements ("warn" or "fail").
+
+        In "fail" mode the error is raised after the handler has done its work
+        (and committed it), so the mode is allowed only with DEBUG=1 (in tests
+        and CI), where a failed request is only a signal.
+        """
+        if self.sql_budget_mode not in ("warn", "fail"):
+            raise ValueError(f"Unknown SQL_BUDGET_MODE {self.sql_budget_mode}")
+        if self.sql_budget_mode == "fail" and os.getenv("DEBUG", "0") != "1":
+            raise ValueError("SQL_BUDGET_MODE=fail is allowed only with DEBUG=1")
+
+
+@dataclass
+class Storage(object):
+    """Config class for the storage backend of tasks and jobs ("sql" or "memory")."""
+
+    backend: str = os.getenv("STORAGE_BACKEND", "sql")
+    directory: str = os.getenv("STORAGE_DIR", "")
+    snapshot_every: int = int(os.getenv("STORAGE_SNAPSHOT_EVERY", "10000"))
+
+
+@dataclass
+class Compression(object):
+    """Config class for compression of the responses and the cache of their bodies."""
+
+    enabled: bool = os.getenv("COMPRESSION_ENABLED", "1") == "1"
+    minimum_size: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    cache_size: int = int(os.getenv("COMPRESSION_CACHE_SIZE", "128"))
+    cache_max_bytes: int = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES", "16777216"))
+
 
 @dataclass
 class Config(object):
@@ -37,3 +114,8 @@ class Config(object):
 
     debug: bool = os.getenv("DEBUG", "0") == "1"
     db: DB = field(default_factory=DB)
+    archive: Archive = field(default_factory=Archive)
+    jobs: Jobs = field(default_factory=Jobs)
+    profiling: Profiling = field(default_factory=Profiling)
+    storage: Storage = field(default_factory=Storage)
+    compression: Compression = field(default_factory=Compression)
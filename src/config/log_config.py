@@ -13,12 +13,12 @@ LOG_CONFIG = {
     },
     "handlers": {
         "console": {
-            "class": "logging.StreamHandler",
+            "class": "src.profiling.metrics.TimedStreamHandler",
             "level": "DEBUG" if config.debug else "INFO",
             "formatter": "base",
         },
         "file": {
-            "class": "logging.handlers.TimedRotatingFileHandler",
+            "class": "src.profiling.metrics.TimedRotatingFileHandler",
             "level": "INFO",
             "formatter": "base",
             "filename": "logfile.log",
@@ -0,0 +1,115 @@
+"""The module responsible for moving done tasks to the archive table."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from typing import Tuple
+
+from sqlalchemy import DateTime, delete, insert, literal, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .models import ArchivedTask, Task
+
+logger = getLogger("main_logger.archive")
+
+ARCHIVED_STATUS: str = "done"
+
+
+def partition_bounds(moment: datetime) -> Tuple[datetime, datetime]:
+    """Return the bounds of the monthly archive partition containing the moment."""
+    start = moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+async def ensure_partition(session: AsyncSession, moment: datetime) -> None:
+    """Create the monthly archive partition for the moment if it does not exist."""
+    start, end = partition_bounds(moment)
+    table: str = ArchivedTask.__tablename__
+    await session.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {table}_{start:%Y_%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    )
+
+
+class TaskArchiver(object):
+    """
+    Moves done tasks older than the given age from the task table to the archive.
+
+    Args:
+        session_maker (async_sessionmaker) - factory of the sessions for the batches.
+        age (timedelta) - how long a task has to stay done before archiving.
+        batch_size (int) - max number of tasks moved in one transaction.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker[AsyncSession],
+        age: timedelta,
+        batch_size: int,
+    ):
+        """Initialize class."""
+        self.session_maker = session_maker
+        self.age = age
+        self.batch_size = batch_size
+
+    async def archive_batch(self, session: AsyncSession) -> int:
+        """
+        Move one batch of tasks to the archive and return the number of moved tasks.
+
+        The rows are deleted and inserted by one statement, so a task is never
+        visible in both tables or in none of them.
+        """
+        now: datetime = datetime.now(timezone.utc)
+        await ensure_partition(session, now)
+
+        candidates = (
+            select(Task.id)
+            .where(Task.status == ARCHIVED_STATUS, Task.updated_at < now - self.age)
+            .order_by(Task.updated_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        moved = (
+            delete(Task)
+            .where(Task.id.in_(candidates.scalar_subquery()))
+            .returning(
+                Task.id, Task.title, Task.description, Task.status, Task.updated_at
+            )
+            .cte("moved")
+        )
+        stmt = (
+            insert(ArchivedTask)
+            .from_select(
+                ["id", "title", "description", "status", "updated_at", "archived_at"],
+                select(
+                    moved.c.id,
+                    moved.c.title,
+                    moved.c.description,
+                    moved.c.status,
+                    moved.c.updated_at,
+                    literal(now, DateTime(timezone=True)),
+                ),
+            )
+            .add_cte(moved)
+        )
+        result = await session.execute(stmt)
+        await session.commit()
+        return result.rowcount  # type: ignore[attr-defined]
+
+    async def run(self, interval: float) -> None:
+        """Archive tasks in batches until cancelled, sleeping when nothing is left."""
+        while True:
+            moved: int = 0
+            try:
+                async with self.session_maker() as session:
+                    moved = await self.archive_batch(session)
+                if moved:
+                    logger.info("Moved %d tasks to the archive.", moved)
+            except Exception as exc:
+                logger.exception(str(exc))
+
+            if moved < self.batch_size:
+                await asyncio.sleep(interval)
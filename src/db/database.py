@@ -1,9 +1,7 @@
 """The module responsible for configuring the connection to the database."""
 
-from logging import getLogger
-from typing import Any, AsyncGenerator
+from typing import List
 
-from fastapi import Request
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -13,21 +11,13 @@ from sqlalchemy.ext.asyncio import (
 
 from src.config.app_config import Config
 
-logger = getLogger("main.db")
-
 db_config = Config().db
 
-engine: AsyncEngine = create_async_engine(db_config.url)
-Session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
-
-
-async def dependency_session(request: Request) -> AsyncGenerator[AsyncSession, Any]:
-    """Create a transaction and save session obj to request.state.session."""
-    async with Session() as session_:
-        try:
-            request.state.session = session_
-            yield session_
-        except Exception as exc:
-            logger.exception(str(exc))
-            await session_.rollback()
-            raise exc
+# The first shard is the main database.
+engines: List[AsyncEngine] = [create_async_engine(url) for url in db_config.shard_urls]
+shard_sessions: List[async_sessionmaker[AsyncSession]] = [
+    async_sessionmaker(engine_, expire_on_commit=False, class_=AsyncSession)
+    for engine_ in engines
+]
+engine: AsyncEngine = engines[0]
+Session = shard_sessions[0]
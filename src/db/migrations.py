@@ -0,0 +1,128 @@
+"""
+The module responsible for bringing the tables of existing databases up to date.
+
+create_all only creates the missing tables, so the changes of the existing ones
+are applied here. The cheap ones (MIGRATIONS) are idempotent and run on every
+start. The ones which scan or rewrite a whole table (HEAVY_MIGRATIONS) are not
+run on startup: run them once on all databases of the config at a quiet time:
+
+    python -m src.db.migrations
+
+Building the index does not block the writes, but changing the type of the ids
+rewrites the task table and its indexes under the ACCESS EXCLUSIVE lock,
+so the tasks can be neither read nor written until it is done.
+"""
+
+import asyncio
+import logging.config
+from logging import getLogger
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from src.config.log_config import LOG_CONFIG
+
+from .database import engines
+
+logger = getLogger("main_logger.migrations")
+
+# In the order of the changes of the models.
+MIGRATIONS: List[str] = [
+    # The time of the last change of the task, the archive is filled by it.
+    # The existing tasks get the time of the migration (without a rewrite
+    # of the table, the default is not volatile).
+    "ALTER TABLE task ADD COLUMN IF NOT EXISTS "
+    "updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()",
+]
+
+HEAVY_MIGRATIONS: List[str] = [
+    # The index of the archiver. A build interrupted by an error leaves
+    # an invalid index, which is dropped to be built again.
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM pg_index
+            WHERE indexrelid = to_regclass('ix_task_status_updated_at')
+                AND NOT indisvalid
+        ) THEN
+            DROP INDEX ix_task_status_updated_at;
+        END IF;
+    END
+    $$
+    """,
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_task_status_updated_at "
+    "ON task (status, updated_at)",
+    # The ids of the tasks encode their buckets, so they do not fit into INTEGER
+    # once there are several shards (see src.db.sharding).
+    """
+    DO $$
+    BEGIN
+        IF (
+            SELECT data_type FROM information_schema.columns
+            WHERE table_schema = current_schema()
+                AND table_name = 'task' AND column_name = 'id'
+        ) = 'integer' THEN
+            ALTER TABLE task ALTER COLUMN id TYPE BIGINT;
+            ALTER SEQUENCE task_id_seq AS BIGINT;
+        END IF;
+        IF (
+            SELECT data_type FROM information_schema.columns
+            WHERE table_schema = current_schema()
+                AND table_name = 'task_archive' AND column_name = 'id'
+        ) = 'integer' THEN
+            ALTER TABLE task_archive ALTER COLUMN id TYPE BIGINT;
+        END IF;
+    END
+    $$
+    """,
+]
+
+
+async def migrate(conn: AsyncConnection) -> None:
+    """Apply the migrations to the database of the connection."""
+    for statement in MIGRATIONS:
+        await conn.execute(text(statement))
+    logger.info("The database is up to date.")
+
+
+async def has_integer_ids(conn: AsyncConnection) -> bool:
+    """Check that the ids of the tasks are still INTEGER (see HEAVY_MIGRATIONS)."""
+    data_type_q = await conn.execute(
+        text(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_schema = current_schema() "
+            "AND table_name = 'task' AND column_name = 'id'"
+        )
+    )
+    return data_type_q.scalar_one_or_none() == "integer"
+
+
+async def migrate_heavy(engine: AsyncEngine) -> None:
+    """
+    Apply the heavy migrations to the database of the engine.
+
+    Every statement is committed on its own: the index is built concurrently,
+    which is not possible inside a transaction.
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for statement in HEAVY_MIGRATIONS:
+            await conn.execute(text(statement))
+    logger.info("The heavy migrations of %s are done.", engine.url.database)
+
+
+async def main() -> None:
+    """Apply the heavy migrations to all databases of the config."""
+    logging.config.dictConfig(LOG_CONFIG)
+    try:
+        for engine in engines:
+            await migrate_heavy(engine)
+    finally:
+        for engine in engines:
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
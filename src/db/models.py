@@ -1,6 +1,19 @@
 """The module responsible for model descriptions in the database."""
 
-from sqlalchemy import Integer, String, Text
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import (
+    DDL,
+    BigInteger,
+    DateTime,
+    Index,
+    Integer,
+    String,
+    Text,
+    event,
+    func,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -11,15 +24,93 @@ class Base(DeclarativeBase):
 
 
 class Task(Base):
-    """ORM representation of a table in which task records will be stored."""
+    """
+    ORM representation of a table in which task records will be stored.
+
+    The id encodes the shard of the task (see src.db.sharding).
+    """
 
     __tablename__ = "task"
+    __table_args__ = (Index("ix_task_status_updated_at", "status", "updated_at"),)
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String, nullable=False)
     description: Mapped[str] = mapped_column(Text, nullable=False)
     status: Mapped[str] = mapped_column(String(15), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
 
     def __repr__(self) -> str:
         """Return the string representation of the object."""
         return f"{self.title} ({self.id}), status: {self.status}"
+
+
+class ArchivedTask(Base):
+    """
+    ORM representation of the archive of done tasks.
+
+    The table is partitioned by month of archiving (see src.db.archive),
+    so the primary key has to include the partition key.
+    """
+
+    __tablename__ = "task_archive"
+    __table_args__ = {"postgresql_partition_by": "RANGE (archived_at)"}
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    title: Mapped[str] = mapped_column(String, nullable=False)
+    description: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(String(15), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True, server_default=func.now()
+    )
+
+    def __repr__(self) -> str:
+        """Return the string representation of the object."""
+        return f"{self.title} ({self.id}), archived at: {self.archived_at}"
+
+
+class Job(Base):
+    """ORM representation of a table in which import and export jobs are stored."""
+
+    __tablename__ = "job"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(15), nullable=False)
+    status: Mapped[str] = mapped_column(String(15), nullable=False)
+    media_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    task_status: Mapped[Optional[str]] = mapped_column(String(15), nullable=True)
+    path: Mapped[str] = mapped_column(String, nullable=False)
+    processed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now(),
+    )
+
+    def __repr__(self) -> str:
+        """Return the string representation of the object."""
+        return f"{self.kind} job ({self.id}), status: {self.status}"
+
+
+# Rows that do not fall into any monthly partition are kept here.
+event.listen(
+    ArchivedTask.__table__,
+    "after_create",
+    DDL(
+        f"CREATE TABLE IF NOT EXISTS {ArchivedTask.__tablename__}_default "
+        f"PARTITION OF {ArchivedTask.__tablename__} DEFAULT"
+    ),
+)
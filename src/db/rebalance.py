@@ -0,0 +1,185 @@
+"""
+The module responsible for moving tasks between shards after adding a shard.
+
+When the number of shards changes, some buckets are assigned to other shards
+(see src.db.sharding), and their tasks have to be moved there. Run it once
+with the new POSTGRES_SHARD_URLS (the new shards get the tables on startup
+of the app):
+
+    python -m src.db.rebalance
+"""
+
+import argparse
+import asyncio
+import logging.config
+from logging import getLogger
+from typing import Any, Dict, List, Sequence, Type, Union
+
+from sqlalchemy import (
+    BigInteger,
+    Integer,
+    any_,
+    bindparam,
+    delete,
+    func,
+    literal,
+    select,
+    text,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.config.log_config import LOG_CONFIG
+
+from .archive import ensure_partition
+from .database import engines, shard_sessions
+from .models import ArchivedTask, Task
+from .sharding import (
+    BUCKET_MASK,
+    BUCKETS,
+    TASK_ID_SEQUENCE,
+    bucket_of,
+    local_id_of,
+    shard_of_bucket,
+)
+
+logger = getLogger("main_logger.rebalance")
+
+MODELS: Sequence[Union[Type[Task], Type[ArchivedTask]]] = (Task, ArchivedTask)
+
+
+class ShardRebalancer(object):
+    """
+    Moves the tasks (archived ones too) whose buckets belong to other shards.
+
+    Every batch is first committed to the target shard and then deleted
+    from the source one, so an interrupted run leaves copies, not losses,
+    and the next run finishes the move.
+
+    Args:
+        session_makers (Sequence[async_sessionmaker]) - factories of the sessions
+            of all shards (the new ones included), in the order of the config.
+        batch_size (int) - max number of tasks moved in one transaction.
+    """
+
+    def __init__(
+        self,
+        session_makers: Sequence[async_sessionmaker[AsyncSession]],
+        batch_size: int,
+    ):
+        """Initialize class."""
+        self.session_makers = session_makers
+        self.batch_size = batch_size
+
+    async def move_batch(
+        self,
+        source: int,
+        model: Union[Type[Task], Type[ArchivedTask]],
+        last_id: int = 0,
+    ) -> List[int]:
+        """
+        Move one batch of misplaced rows of the model with ids after last_id.
+
+        Return the ids of the moved rows, in ascending order. The batches
+        are read by keyset pagination, so every row of the source shard is
+        scanned once per run (the rows locked by others are left to the next run).
+        """
+        shards: int = len(self.session_makers)
+        misplaced: List[int] = [
+            bucket
+            for bucket in range(BUCKETS)
+            if shard_of_bucket(bucket, shards) != source
+        ]
+
+        async with self.session_makers[source]() as source_session:
+            rows_q = await source_session.execute(
+                select(*model.__table__.c)
+                .where(
+                    model.id > last_id,
+                    model.id.op("&")(literal(BUCKET_MASK, BigInteger))
+                    == any_(bindparam("buckets", misplaced, type_=ARRAY(Integer))),
+                )
+                .order_by(model.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            rows: List[Dict[str, Any]] = [dict(row) for row in rows_q.mappings()]
+            if not rows:
+                return []
+
+            rows_by_shard: Dict[int, List[Dict[str, Any]]] = {}
+            for row in rows:
+                target: int = shard_of_bucket(bucket_of(row["id"]), shards)
+                rows_by_shard.setdefault(target, []).append(row)
+            for target, target_rows in rows_by_shard.items():
+                await self._insert(target, model, target_rows)
+
+            moved_ids: List[int] = [row["id"] for row in rows]
+            await source_session.execute(delete(model).where(model.id.in_(moved_ids)))
+            await source_session.commit()
+        return moved_ids
+
+    async def _insert(
+        self,
+        target: int,
+        model: Union[Type[Task], Type[ArchivedTask]],
+        rows: List[Dict[str, Any]],
+    ) -> None:
+        """
+        Insert the rows to the target shard (skipping the already moved ones).
+
+        The sequence of the shard is moved past the moved local ids,
+        so the new tasks of the moved buckets do not get the same ids.
+        """
+        async with self.session_makers[target]() as session:
+            if model is ArchivedTask:
+                for archived_at in {row["archived_at"] for row in rows}:
+                    await ensure_partition(session, archived_at)
+
+            await session.execute(insert(model).values(rows).on_conflict_do_nothing())
+            await session.execute(
+                select(
+                    func.setval(
+                        TASK_ID_SEQUENCE,
+                        func.greatest(
+                            max(local_id_of(row["id"]) for row in rows),
+                            text(f"(SELECT last_value FROM {TASK_ID_SEQUENCE})"),
+                        ),
+                    )
+                )
+            )
+            await session.commit()
+
+    async def run(self) -> int:
+        """Move all misplaced tasks and return the number of moved tasks."""
+        moved: int = 0
+        for source in range(len(self.session_makers)):
+            for model in MODELS:
+                last_id: int = 0
+                while batch := await self.move_batch(source, model, last_id):
+                    moved += len(batch)
+                    last_id = batch[-1]
+                    logger.info(
+                        "Moved %d rows of %s from the shard %d.",
+                        len(batch),
+                        model.__tablename__,
+                        source,
+                    )
+        return moved
+
+
+async def main(batch_size: int) -> None:
+    """Move the misplaced tasks of all shards of the config."""
+    logging.config.dictConfig(LOG_CONFIG)
+    try:
+        moved: int = await ShardRebalancer(shard_sessions, batch_size).run()
+        logger.info("Rebalancing is done, %d tasks moved.", moved)
+    finally:
+        for engine in engines:
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args().batch_size))
@@ -1,13 +1,71 @@
 """The module responsible for database queries."""
 
-from typing import List, Optional
+import asyncio
+from collections import defaultdict
+from datetime import timedelta
+from itertools import chain
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
 
-from sqlalchemy import select
+from sqlalchemy import (
+    BigInteger,
+    CompoundSelect,
+    Select,
+    any_,
+    bindparam,
+    func,
+    insert,
+    literal,
+    select,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.schemas.schemas import TaskInSchema, TaskOutSchema
+from src.profiling.metrics import SERIALIZATION, timing
+from src.schemas.schemas import JobOutSchema, TaskInSchema, TaskOutSchema
+from src.storage.base import JobStorage, TaskStorage
 
-from .models import Task
+from .models import ArchivedTask, Job, Task
+from .sharding import (
+    MERGE_BATCH_SIZE,
+    TASK_ID_SEQUENCE,
+    ShardedSession,
+    bucket_for_key,
+    bucket_of,
+    make_id,
+    merge_by_id,
+    new_id,
+    shard_of_bucket,
+)
+
+COPY_COLUMNS: List[str] = ["title", "description", "status"]
+
+
+def select_tasks(
+    model: Union[Type[Task], Type[ArchivedTask]], status: Optional[str] = None
+) -> Select:
+    """Select the columns of TaskOutSchema from the task table or its archive."""
+    query = select(model.id, model.title, model.description, model.status)
+    if status is not None:
+        query = query.where(model.status == status)
+    return query
+
+
+def _to_schemas(items: Iterable[Any]) -> List[TaskOutSchema]:
+    """Convert the rows or ORM objects of the tasks to the response models."""
+    with timing(SERIALIZATION):
+        return [TaskOutSchema.model_validate(item) for item in items]
 
 
 class BaseRepository(object):
@@ -25,53 +83,420 @@ class BaseRepository(object):
         self.session = session
 
 
-class TaskRepository(BaseRepository):
-    """The task repository."""
+class TaskRepository(BaseRepository, TaskStorage):
+    """
+    The task repository (the SQL backend of TaskStorage).
+
+    The tasks are spread over the shards (see src.db.sharding): queries by id
+    go straight to the shard of the id, the other ones are run on all shards
+    concurrently and their results are merged in the order of ids.
+    With a single database, the ids are given out by the table as they are.
+
+    Args:
+        session (AsyncSession | ShardedSession) - sessions of the shards
+            (or the session of the only database).
+    """
 
     not_found_error_str: str = "The task not found"
 
-    async def create(self, data: TaskInSchema) -> int:
-        """Create a new item."""
-        new_item = Task(**data.model_dump())
-        self.session.add(new_item)
-        await self.session.commit()
-        return new_item.id
+    def __init__(self, session: Union[AsyncSession, ShardedSession]):
+        """Initialize class."""
+        self.shards: ShardedSession = (
+            session
+            if isinstance(session, ShardedSession)
+            else ShardedSession.of(session)
+        )
+        super().__init__(self.shards.for_shard(0))
+
+    def _bucket(self, shard_key: Optional[str] = None) -> Optional[int]:
+        """Return the bucket for the shard key (None if there is a single database)."""
+        if self.shards.shards == 1:
+            return None
+        return bucket_for_key(shard_key)
+
+    async def create(self, data: TaskInSchema, shard_key: Optional[str] = None) -> int:
+        """Create a new item in the shard of the shard key (a random one if None)."""
+        bucket: Optional[int] = self._bucket(shard_key)
+        query = insert(Task).values(**data.model_dump()).returning(Task.id)
+        if bucket is None:
+            session: AsyncSession = self.shards.for_shard(0)
+        else:
+            session = self.shards.for_bucket(bucket)
+            query = query.values(id=new_id(literal(bucket, BigInteger)))
+
+        id_q = await session.execute(query)
+        task_id: int = id_q.scalar_one()
+        await session.commit()
+        return task_id
 
-    async def get_all(self) -> List[TaskOutSchema]:
-        """Get all items."""
-        items_q = await self.session.execute(select(Task))
-        return [TaskOutSchema.model_validate(item) for item in items_q.scalars().all()]
+    async def create_many(
+        self, data: Sequence[TaskInSchema], shard_key: Optional[str] = None
+    ) -> List[int]:
+        """
+        Create new items and return their ids.
+
+        Every shard gets one INSERT statement, the shards are written concurrently.
+        Without the shard key, every item gets a random shard.
+        """
+        if not data:
+            return []
+
+        if self.shards.shards == 1:
+            buckets: List[Optional[int]] = [None] * len(data)
+        elif shard_key is None:
+            buckets = [bucket_for_key() for _ in data]
+        else:
+            buckets = [bucket_for_key(shard_key)] * len(data)
+        positions_by_shard: Dict[int, List[int]] = defaultdict(list)
+        for position, bucket in enumerate(buckets):
+            shard: int = (
+                0 if bucket is None else shard_of_bucket(bucket, self.shards.shards)
+            )
+            positions_by_shard[shard].append(position)
+
+        async def create_in_shard(shard: int, positions: List[int]) -> List[int]:
+            session: AsyncSession = self.shards.for_shard(shard)
+            query = insert(Task).returning(Task.id, sort_by_parameter_order=True)
+            params: List[Dict[str, Any]] = [
+                data[position].model_dump() for position in positions
+            ]
+            if self.shards.shards > 1:
+                query = query.values(id=new_id(bindparam("bucket", type_=BigInteger)))
+                for position, param in zip(positions, params):
+                    param["bucket"] = buckets[position]
+
+            ids_q = await session.execute(query, params)
+            shard_ids: List[int] = list(ids_q.scalars().all())
+            await session.commit()
+            return shard_ids
+
+        results: List[List[int]] = await asyncio.gather(
+            *(
+                create_in_shard(shard, positions)
+                for shard, positions in positions_by_shard.items()
+            )
+        )
+
+        ids: List[int] = [0] * len(data)
+        for positions, shard_ids in zip(positions_by_shard.values(), results):
+            for position, task_id in zip(positions, shard_ids):
+                ids[position] = task_id
+        return ids
+
+    async def get_all(self, include_archived: bool = False) -> List[TaskOutSchema]:
+        """Get all items (including the archived ones if include_archived)."""
+        return await self._get_from_all_shards(None, include_archived)
 
     async def get(self, idx: int) -> Optional[TaskOutSchema]:
-        """Get the item by id. If item not found - return None."""
-        item = await self.session.get(Task, idx)
+        """
+        Get the item by id. If item not found - return None.
+
+        If the task is not in the task table, it is looked up in the archive.
+        """
+        session: AsyncSession = self.shards.for_id(idx)
+        item: Optional[Union[Task, ArchivedTask]] = await session.get(Task, idx)
+
+        if not item:
+            archived_q = await session.execute(
+                select(ArchivedTask).where(ArchivedTask.id == idx)
+            )
+            item = archived_q.scalars().first()
 
         if not item:
             return None
-        return TaskOutSchema.model_validate(item)
+        return _to_schemas([item])[0]
+
+    async def get_many(
+        self, ids: Sequence[int]
+    ) -> Tuple[List[TaskOutSchema], List[int]]:
+        """
+        Get the items by ids with one query per shard (archived tasks included).
+
+        Return the found items in the order of ids and the ids that were not found.
+        The ids are sent as one array parameter, so the statement is the same
+        for any number of ids.
+        """
+        unique_ids: List[int] = list(dict.fromkeys(ids))
+        ids_by_shard: Dict[int, List[int]] = defaultdict(list)
+        for idx in unique_ids:
+            ids_by_shard[shard_of_bucket(bucket_of(idx), self.shards.shards)].append(
+                idx
+            )
+
+        async def get_from_shard(shard: int, shard_ids: List[int]) -> List[Any]:
+            ids_param = bindparam("ids", shard_ids, type_=ARRAY(BigInteger))
+            tasks_q = await self.shards.for_shard(shard).execute(
+                select_tasks(Task)
+                .where(Task.id == any_(ids_param))
+                .union_all(
+                    select_tasks(ArchivedTask).where(ArchivedTask.id == any_(ids_param))
+                )
+            )
+            return list(tasks_q.all())
+
+        results: List[List[Any]] = await asyncio.gather(
+            *(
+                get_from_shard(shard, shard_ids)
+                for shard, shard_ids in ids_by_shard.items()
+            )
+        )
+        found = {task.id: task for task in _to_schemas(chain.from_iterable(results))}
+        return (
+            [found[idx] for idx in unique_ids if idx in found],
+            [idx for idx in unique_ids if idx not in found],
+        )
 
     async def update(self, item_id: int, data: TaskInSchema) -> None:
         """Update the item by id. If item not found - raise ValueError."""
         data_dict = data.model_dump(exclude_unset=True)
 
-        item = await self.session.get(Task, item_id)
+        session: AsyncSession = self.shards.for_id(item_id)
+        item = await session.get(Task, item_id)
         if not item:
             raise ValueError(self.not_found_error_str)
 
         for key, value in data_dict.items():
             setattr(item, key, value)
-        await self.session.flush()
+        await session.commit()
 
     async def delete(self, item_id: int) -> None:
         """Delete the item by id. If item not found - raise ValueError."""
-        item = await self.session.get(Task, item_id)
+        session: AsyncSession = self.shards.for_id(item_id)
+        item = await session.get(Task, item_id)
         if not item:
             raise ValueError(self.not_found_error_str)
 
-        await self.session.delete(item)
+        await session.delete(item)
+        await session.commit()
+
+    async def get_all_by_status(
+        self, status: str, include_archived: bool = False
+    ) -> List[TaskOutSchema]:
+        """Get all tasks with status (and the archived ones if include_archived)."""
+        return await self._get_from_all_shards(status, include_archived)
+
+    async def count(self, status: Optional[str] = None) -> int:
+        """Count the tasks (with the status, if any) in all shards concurrently."""
+        query = select(func.count()).select_from(select_tasks(Task, status).subquery())
+        results = await asyncio.gather(
+            *(session.execute(query) for session in self.shards.all())
+        )
+        return sum(result.scalar_one() for result in results)
+
+    async def iter_batches(
+        self, status: Optional[str], batch_size: int
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Iterate over the tasks (with the status, if any) in batches of rows.
+
+        The shards are read one by one, each by keyset pagination.
+        """
+        for session in self.shards.all():
+            last_id: int = 0
+            while True:
+                batch_q = await session.execute(
+                    select_tasks(Task, status)
+                    .where(Task.id > last_id)
+                    .order_by(Task.id)
+                    .limit(batch_size)
+                )
+                rows: List[Dict[str, Any]] = [dict(row) for row in batch_q.mappings()]
+                if not rows:
+                    break
+
+                last_id = rows[-1]["id"]
+                yield rows
+
+    async def import_many(self, data: Sequence[TaskInSchema]) -> None:
+        """
+        Save the batch of imported tasks with COPY, each in a random bucket.
+
+        The batch is split by shards, which are written concurrently.
+        """
+        if self.shards.shards == 1:
+            await self._copy_to_shard(0, list(data), None)
+            return
+
+        tasks_by_shard: Dict[int, List[TaskInSchema]] = defaultdict(list)
+        buckets_by_shard: Dict[int, List[int]] = defaultdict(list)
+        for task in data:
+            bucket: int = bucket_for_key()
+            shard: int = shard_of_bucket(bucket, self.shards.shards)
+            tasks_by_shard[shard].append(task)
+            buckets_by_shard[shard].append(bucket)
+
+        await asyncio.gather(
+            *(
+                self._copy_to_shard(shard, tasks, buckets_by_shard[shard])
+                for shard, tasks in tasks_by_shard.items()
+            )
+        )
+
+    async def _copy_to_shard(
+        self,
+        shard: int,
+        tasks: List[TaskInSchema],
+        buckets: Optional[List[int]],
+    ) -> None:
+        """
+        Send the tasks to the shard with COPY.
+
+        If the buckets of the tasks are passed, their ids are reserved
+        in the shard beforehand, otherwise the ids are given out by the table.
+        """
+        session: AsyncSession = self.shards.for_shard(shard)
+        rows: List[Tuple[Any, ...]] = [
+            (task.title, task.description, task.status) for task in tasks
+        ]
+        columns: List[str] = COPY_COLUMNS
+        if buckets is not None:
+            local_ids_q = await session.execute(
+                select(func.nextval(TASK_ID_SEQUENCE)).select_from(
+                    func.generate_series(1, len(tasks))
+                )
+            )
+            rows = [
+                (make_id(bucket, local_id), *row)
+                for bucket, local_id, row in zip(
+                    buckets, local_ids_q.scalars().all(), rows
+                )
+            ]
+            columns = ["id"] + COPY_COLUMNS
+
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        copy_connection: Any = raw_connection.driver_connection
+        await copy_connection.copy_records_to_table(
+            Task.__tablename__, records=rows, columns=columns
+        )
+        await session.commit()
+
+    async def _get_from_all_shards(
+        self, status: Optional[str], include_archived: bool
+    ) -> List[TaskOutSchema]:
+        """
+        Get the tasks from all shards concurrently, ordered by id.
+
+        The rows are streamed from the shards and merged as they arrive.
+        """
+        query: Union[Select, CompoundSelect] = select_tasks(Task, status)
+        if include_archived:
+            query = select_tasks(Task, status).union_all(
+                select_tasks(ArchivedTask, status)
+            )
+        query = query.order_by(query.selected_columns.id).execution_options(
+            yield_per=MERGE_BATCH_SIZE
+        )
+
+        results = await asyncio.gather(
+            *(session.stream(query) for session in self.shards.all())
+        )
+        tasks: List[TaskOutSchema] = []
+        async for rows in merge_by_id(results):
+            tasks.extend(_to_schemas(rows))
+        return tasks
+
+
+class JobRepository(BaseRepository, JobStorage):
+    """The repository of the import and export jobs (the SQL backend of JobStorage)."""
+
+    not_found_error_str: str = "The job not found"
+
+    async def create(
+        self, kind: str, media_type: str, path: str, task_status: Optional[str] = None
+    ) -> int:
+        """Create a new pending job."""
+        new_item = Job(
+            kind=kind,
+            status="pending",
+            media_type=media_type,
+            path=path,
+            task_status=task_status,
+        )
+        self.session.add(new_item)
         await self.session.commit()
+        return new_item.id
+
+    async def get(self, idx: int) -> Optional[JobOutSchema]:
+        """Get the job by id. If job not found - return None."""
+        item = await self.session.get(Job, idx)
 
-    async def get_all_by_status(self, status: str) -> List[TaskOutSchema]:
-        """Get all tasks with status (or all tasks if status is None)."""
-        tasks_q = await self.session.execute(select(Task).where(Task.status == status))
-        return [TaskOutSchema.model_validate(task) for task in tasks_q.scalars().all()]
+        if not item:
+            return None
+        return JobOutSchema.model_validate(item)
+
+    async def get_result(self, idx: int) -> Optional[Tuple[str, str]]:
+        """Get the path and the format of the file of the finished export job."""
+        result_q = await self.session.execute(
+            select(Job.path, Job.media_type).where(
+                Job.id == idx, Job.kind == "export", Job.status == "done"
+            )
+        )
+        result = result_q.first()
+
+        if not result:
+            return None
+        return result.path, result.media_type
+
+    async def get_pending_ids(self) -> List[int]:
+        """Get ids of the jobs which have not been started yet."""
+        ids_q = await self.session.execute(
+            select(Job.id).where(Job.status == "pending").order_by(Job.id)
+        )
+        return list(ids_q.scalars().all())
+
+    async def start(self, idx: int) -> Optional[Job]:
+        """
+        Mark the pending job as running and return it.
+
+        If the job is not pending (e.g. it was taken by another worker) - return None.
+        """
+        job_q = await self.session.execute(
+            update(Job)
+            .where(Job.id == idx, Job.status == "pending")
+            .values(status="running")
+            .returning(Job)
+        )
+        job: Optional[Job] = job_q.scalars().first()
+        await self.session.commit()
+        return job
+
+    async def progress(
+        self, idx: int, processed: int, total: Optional[int] = None
+    ) -> None:
+        """Save the progress of the job (and the work done together with it)."""
+        values: dict = {"processed": processed}
+        if total is not None:
+            values["total"] = total
+        await self.session.execute(update(Job).where(Job.id == idx).values(**values))
+        await self.session.commit()
+
+    async def finish(self, idx: int) -> None:
+        """Mark the job as done."""
+        await self.session.execute(
+            update(Job).where(Job.id == idx).values(status="done")
+        )
+        await self.session.commit()
+
+    async def fail(self, idx: int, error: str) -> None:
+        """Mark the job as failed with the error."""
+        await self.session.execute(
+            update(Job).where(Job.id == idx).values(status="failed", error=error)
+        )
+        await self.session.commit()
+
+    async def fail_stale(
+        self, age: timedelta, error: str, exclude: Sequence[int] = ()
+    ) -> List[int]:
+        """Mark the running jobs which have not been updated for age as failed."""
+        query = update(Job).where(
+            Job.status == "running", Job.updated_at <= func.now() - age
+        )
+        if exclude:
+            query = query.where(Job.id.not_in(exclude))
+        ids_q = await self.session.execute(
+            query.values(status="failed", error=error).returning(Job.id)
+        )
+        ids: List[int] = list(ids_q.scalars().all())
+        await self.session.commit()
+        return ids
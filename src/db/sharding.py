@@ -0,0 +1,227 @@
+"""
+The module responsible for spreading tasks over several databases (shards).
+
+Every task belongs to one of BUCKETS logical buckets, and the bucket is
+the low bits of the task id:
+
+    id = local id from the sequence of the shard << BUCKET_BITS | bucket
+
+so the shard of a task is known from its id alone, and ids stay small
+and ordered roughly by the time of creation. With several shards, the bucket
+is chosen by the hash of the shard key of the task (a random one without it).
+With a single database, ids are plain values of the sequence, as before
+sharding: their low bits serve as the bucket when shards are added.
+Buckets are assigned to the shards by jump consistent hashing, so adding
+a shard moves only about 1/N of the buckets (see src.db.rebalance).
+Ids stay below 2 ** 53, so they are safe for JavaScript clients.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import ColumnElement, Integer, func, literal, select, text
+from sqlalchemy.ext.asyncio import AsyncResult, AsyncSession
+
+from .models import ArchivedTask, Task
+
+BUCKET_BITS: int = 10
+BUCKETS: int = 1 << BUCKET_BITS
+BUCKET_MASK: int = BUCKETS - 1
+
+TASK_ID_SEQUENCE: str = "task_id_seq"
+
+# The number of rows fetched from a shard at once when the lists are merged.
+MERGE_BATCH_SIZE: int = 1000
+
+
+def make_id(bucket: int, local_id: int) -> int:
+    """Return the id of the task from its bucket and local id."""
+    return local_id << BUCKET_BITS | bucket
+
+
+def bucket_of(idx: int) -> int:
+    """Return the bucket of the task id."""
+    return idx & BUCKET_MASK
+
+
+def local_id_of(idx: int) -> int:
+    """Return the local id (from the sequence of the shard) of the task id."""
+    return idx >> BUCKET_BITS
+
+
+def bucket_for_key(shard_key: Optional[str] = None) -> int:
+    """Return the bucket for the shard key (a random one if there is no key)."""
+    if shard_key is None:
+        shard_key = uuid.uuid4().hex
+    digest: bytes = hashlib.blake2b(shard_key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % BUCKETS
+
+
+def shard_of_bucket(bucket: int, shards: int) -> int:
+    """Return the shard of the bucket (jump consistent hash, Lamping & Veach)."""
+    key: int = bucket
+    shard: int = -1
+    next_shard: int = 0
+    while next_shard < shards:
+        shard = next_shard
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        next_shard = int((shard + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return shard
+
+
+def buckets_of_shard(shard: int, shards: int) -> List[int]:
+    """Return all buckets assigned to the shard."""
+    return [
+        bucket for bucket in range(BUCKETS) if shard_of_bucket(bucket, shards) == shard
+    ]
+
+
+def new_id(bucket: ColumnElement) -> ColumnElement:
+    """Return the SQL expression of a new task id in the bucket (an SQL expression)."""
+    return (func.nextval(TASK_ID_SEQUENCE).op("<<")(literal(BUCKET_BITS, Integer))).op(
+        "|"
+    )(bucket)
+
+
+async def align_sequences(
+    session_makers: Sequence[Callable[[], AsyncSession]],
+) -> None:
+    """
+    Move the sequences of all shards past the local ids of the tasks of all shards.
+
+    Tasks are moved between the shards (see src.db.rebalance), so a shard
+    must not give out the local ids of the tasks which may be moved to it.
+    This is the case for the plain ids of a single database, whose low bits
+    become the buckets once shards are added.
+    """
+    max_local_id: int = 0
+    for session_maker in session_makers:
+        async with session_maker() as session:
+            for model in (Task, ArchivedTask):
+                max_q = await session.execute(select(func.max(model.id)))
+                max_local_id = max(max_local_id, local_id_of(max_q.scalar() or 0))
+
+    for session_maker in session_makers:
+        async with session_maker() as session:
+            await session.execute(
+                select(
+                    func.setval(
+                        TASK_ID_SEQUENCE,
+                        func.greatest(
+                            max_local_id,
+                            text(f"(SELECT last_value FROM {TASK_ID_SEQUENCE})"),
+                        ),
+                    )
+                )
+            )
+            await session.commit()
+
+
+async def merge_by_id(
+    results: Sequence[AsyncResult], batch_size: int = MERGE_BATCH_SIZE
+) -> AsyncIterator[List[Any]]:
+    """
+    Merge the streamed rows of the shards, each ordered by id, into one ordered.
+
+    The rows are fetched from every shard in partitions of batch_size as
+    the merge reaches them, and the merged rows are yielded in batches
+    of the same size, so only a partition of every shard is held at once.
+    """
+    partitions: List[AsyncIterator[Sequence[Any]]] = [
+        aiter(result.partitions(batch_size)) for result in results
+    ]
+    buffers: List[Sequence[Any]] = list(
+        await asyncio.gather(*(anext(shard_rows, []) for shard_rows in partitions))
+    )
+    heap: List[Tuple[int, int, int]] = [
+        (rows[0].id, shard, 0) for shard, rows in enumerate(buffers) if rows
+    ]
+    heapq.heapify(heap)
+
+    batch: List[Any] = []
+    while heap:
+        _, shard, pos = heap[0]
+        batch.append(buffers[shard][pos])
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+        pos += 1
+        if pos == len(buffers[shard]):
+            buffers[shard], pos = await anext(partitions[shard], []), 0
+        if buffers[shard]:
+            heapq.heapreplace(heap, (buffers[shard][pos].id, shard, pos))
+        else:
+            heapq.heappop(heap)
+
+    if batch:
+        yield batch
+
+
+class ShardedSession(object):
+    """
+    Sessions of all shards of a request, opened when they are needed.
+
+    Args:
+        session_makers (Sequence[Callable]) - factories of the sessions of the shards.
+    """
+
+    def __init__(self, session_makers: Sequence[Callable[[], AsyncSession]]):
+        """Initialize class."""
+        self.session_makers = session_makers
+        self._sessions: Dict[int, AsyncSession] = {}
+        self._owned: bool = True
+
+    @classmethod
+    def of(cls, session: AsyncSession) -> "ShardedSession":
+        """Wrap the session of the only database (it is not closed by the wrapper)."""
+        sharded = cls([lambda: session])
+        sharded._sessions[0] = session
+        sharded._owned = False
+        return sharded
+
+    @property
+    def shards(self) -> int:
+        """Return the number of the shards."""
+        return len(self.session_makers)
+
+    def for_shard(self, shard: int) -> AsyncSession:
+        """Return the session of the shard."""
+        if shard not in self._sessions:
+            self._sessions[shard] = self.session_makers[shard]()
+        return self._sessions[shard]
+
+    def for_bucket(self, bucket: int) -> AsyncSession:
+        """Return the session of the shard of the bucket."""
+        return self.for_shard(shard_of_bucket(bucket, self.shards))
+
+    def for_id(self, idx: int) -> AsyncSession:
+        """Return the session of the shard of the task id."""
+        return self.for_bucket(bucket_of(idx))
+
+    def all(self) -> List[AsyncSession]:
+        """Return the sessions of all shards."""
+        return [self.for_shard(shard) for shard in range(self.shards)]
+
+    async def rollback(self) -> None:
+        """Roll back the transactions of the opened sessions."""
+        for session in self._sessions.values():
+            await session.rollback()
+
+    async def close(self) -> None:
+        """Close the opened sessions (unless the session is wrapped by of())."""
+        if self._owned:
+            for session in self._sessions.values():
+                await session.close()
+        self._sessions = {}
+
+    async def __aenter__(self) -> "ShardedSession":
+        """Return the object itself."""
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        """Close the sessions."""
+        await self.close()
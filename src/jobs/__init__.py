@@ -0,0 +1 @@
+"""The package responsible for the background import and export jobs."""
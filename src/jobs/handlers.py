@@ -0,0 +1,79 @@
+"""The module responsible for importing and exporting tasks in batches."""
+
+import asyncio
+from itertools import islice
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from pydantic import ValidationError
+
+from src.schemas import formats
+from src.schemas.schemas import TaskInSchema
+from src.storage.base import JobData, TaskStorage
+
+# Saves the number of processed tasks (and the total number if it is known).
+Progress = Callable[[int, Optional[int]], Awaitable[None]]
+
+
+def _read_batch(
+    rows: Iterator[Dict[str, Any]], size: int, offset: int
+) -> List[TaskInSchema]:
+    """Read and validate the next batch of tasks."""
+    tasks: List[TaskInSchema] = []
+    for number, row in enumerate(islice(rows, size), start=offset + 1):
+        try:
+            tasks.append(TaskInSchema.model_validate(row))
+        except ValidationError as exc:
+            raise ValueError(f"Invalid task #{number}: {exc}") from exc
+    return tasks
+
+
+async def import_tasks(
+    tasks: TaskStorage, job: JobData, batch_size: int, progress: Progress
+) -> None:
+    """
+    Import tasks from the uploaded NDJSON or CSV file.
+
+    The file is read and validated in a thread, every batch is saved
+    by TaskStorage.import_many (COPY for the SQL backend) before the progress.
+    """
+    processed: int = 0
+    with open(job.path, encoding="utf-8", newline="") as file:
+        rows: Iterator[Dict[str, Any]] = formats.read_rows(file, job.media_type)
+        while True:
+            batch = await asyncio.to_thread(_read_batch, rows, batch_size, processed)
+            if not batch:
+                break
+
+            await tasks.import_many(batch)
+            processed += len(batch)
+            await progress(processed, None)
+
+
+async def export_tasks(
+    tasks: TaskStorage, job: JobData, batch_size: int, progress: Progress
+) -> None:
+    """
+    Export tasks (with the status of the job, if any) to the NDJSON or CSV file.
+
+    The tasks are read in batches and written in a thread.
+    """
+    total: int = await tasks.count(job.task_status)
+    await progress(0, total)
+
+    processed: int = 0
+    with open(job.path, "w", encoding="utf-8", newline="") as file:
+        await asyncio.to_thread(formats.write_rows, file, [], job.media_type, True)
+        async for rows in tasks.iter_batches(job.task_status, batch_size):
+            await asyncio.to_thread(
+                formats.write_rows, file, rows, job.media_type, False
+            )
+            processed += len(rows)
+            await progress(processed, total)
+
+
+HANDLERS: Dict[
+    str, Callable[[TaskStorage, JobData, int, Progress], Awaitable[None]]
+] = {
+    "import": import_tasks,
+    "export": export_tasks,
+}
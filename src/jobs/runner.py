@@ -0,0 +1,170 @@
+"""The module responsible for running the jobs in a pool of background workers."""
+
+import asyncio
+import os
+import uuid
+from datetime import timedelta
+from functools import partial
+from logging import getLogger
+from typing import AsyncContextManager, Callable, List, Optional, Set
+
+from src.schemas import formats
+from src.storage.base import JobStorage, StorageSession
+
+from .handlers import HANDLERS
+
+logger = getLogger("main_logger.jobs")
+
+INTERRUPTED_ERROR: str = "The job was interrupted by a stop of the app"
+
+
+class JobRunner(object):
+    """
+    Runs import and export jobs in a pool of background workers.
+
+    The jobs are stored in the database, the runner only keeps the queue
+    of their ids, so the pending jobs are picked up again after a restart.
+    The jobs which were running when the app was stopped (or crashed) stop
+    getting progress, so they are marked as failed once they have not been
+    updated for stale_after seconds; the batches imported before that stay.
+
+    Args:
+        session_maker (Callable) - factory of the storage sessions of the workers.
+        workers (int) - number of the workers (0 - jobs are run only by drain()).
+        directory (str) - directory for the uploaded and exported files.
+        batch_size (int) - number of tasks processed in one transaction.
+        stale_after (int) - seconds without progress after which a running job
+            of no worker of this runner is considered interrupted.
+    """
+
+    def __init__(
+        self,
+        session_maker: Callable[[], AsyncContextManager[StorageSession]],
+        workers: int,
+        directory: str,
+        batch_size: int,
+        stale_after: int = 600,
+    ):
+        """Initialize class."""
+        self.session_maker = session_maker
+        self.workers = workers
+        self.directory = directory
+        self.batch_size = batch_size
+        self.stale_after = stale_after
+        self.queue: asyncio.Queue[int] = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._running: Set[int] = set()
+
+    def new_path(self, kind: str, media_type: str) -> str:
+        """Return a new path for the file of the job."""
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(
+            self.directory,
+            f"{kind}-{uuid.uuid4().hex}.{formats.FILE_MEDIA_TYPES[media_type]}",
+        )
+
+    async def start(self) -> None:
+        """Queue the pending jobs, start the workers and the check of stale jobs."""
+        async with self.session_maker() as storage:
+            for job_id in await storage.jobs.get_pending_ids():
+                self.submit(job_id)
+
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._watch()))
+
+    async def stop(self) -> None:
+        """
+        Stop the workers.
+
+        The interrupted jobs stay running in the database until they are
+        found stale by fail_stale() after the next start.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job_id: int) -> None:
+        """Queue the job."""
+        self.queue.put_nowait(job_id)
+
+    async def drain(self) -> None:
+        """Run all queued jobs in the current task."""
+        while not self.queue.empty():
+            await self.run(self.queue.get_nowait())
+            self.queue.task_done()
+
+    async def fail_stale(self) -> List[int]:
+        """Mark the interrupted running jobs as failed and return their ids."""
+        async with self.session_maker() as storage:
+            job_ids: List[int] = await storage.jobs.fail_stale(
+                timedelta(seconds=self.stale_after),
+                INTERRUPTED_ERROR,
+                exclude=list(self._running),
+            )
+        for job_id in job_ids:
+            logger.warning("Job with id %d was interrupted, marked as failed.", job_id)
+        return job_ids
+
+    async def _watch(self) -> None:
+        """Check for the interrupted jobs every stale_after seconds until cancelled."""
+        while True:
+            try:
+                await self.fail_stale()
+            except Exception as exc:
+                logger.exception(str(exc))
+            await asyncio.sleep(self.stale_after)
+
+    async def _work(self) -> None:
+        """
+        Run the queued jobs one by one until cancelled.
+
+        An error of the storage (e.g. the database is unreachable for a while)
+        is logged and the worker goes on with the next job: the failed one
+        stays pending until the restart or is found stale if it was started.
+        """
+        while True:
+            job_id: int = await self.queue.get()
+            try:
+                await self.run(job_id)
+            except Exception as exc:
+                logger.exception(str(exc))
+            finally:
+                self.queue.task_done()
+
+    async def run(self, job_id: int) -> None:
+        """Run the job. Errors are saved to the job instead of being raised."""
+        async with self.session_maker() as storage:
+            job_rep: JobStorage = storage.jobs
+            job = await job_rep.start(job_id)
+            if job is None:
+                logger.warning("Job with id %d is not pending.", job_id)
+                return
+
+            # The job is expired by the rollback on error, so it is read beforehand.
+            kind, path = job.kind, job.path
+            logger.info("Started %s job with id %d.", kind, job_id)
+            error: Optional[str] = None
+            self._running.add(job_id)
+            try:
+                await HANDLERS[kind](
+                    storage.tasks,
+                    job,
+                    self.batch_size,
+                    partial(job_rep.progress, job_id),
+                )
+            except Exception as exc:
+                logger.exception(str(exc))
+                await storage.rollback()
+                error = str(exc)
+            finally:
+                self._running.discard(job_id)
+
+            if error is None:
+                await job_rep.finish(job_id)
+                logger.info("Job with id %d is done.", job_id)
+            else:
+                await job_rep.fail(job_id, error)
+
+            if kind == "import" and error is None:
+                os.remove(path)
@@ -1,15 +1,25 @@
 """A module for building and launching an application."""
 
+import asyncio
 import logging.config
 from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import List
 
 from fastapi import Depends, FastAPI
 
+from .compression.middleware import CompressionMiddleware
 from .config.app_config import Config
 from .config.log_config import LOG_CONFIG
-from .db.database import dependency_session, engine
-from .db.models import Base
+from .db.archive import TaskArchiver
+from .db.database import engines, shard_sessions
+from .jobs.runner import JobRunner
+from .profiling.middleware import ProfilingMiddleware
+from .routes.jobs_route import router as job_router
 from .routes.tasks_route import router as task_router
+from .storage.base import StorageBackend, dependency_storage
+from .storage.memory import MemoryStorageBackend
+from .storage.sql import SQLStorageBackend
 
 config = Config()
 logging.config.dictConfig(LOG_CONFIG)
@@ -20,6 +30,10 @@ tags_metadata = [
         "name": "Tasks",
         "description": "Operations with tasks.",
     },
+    {
+        "name": "Jobs",
+        "description": "Background import and export of tasks.",
+    },
 ]
 
 
@@ -29,24 +43,57 @@ async def lifespan(app_: FastAPI):
     Add behavior before launching and after shutting down the app.
 
     The function adds data lifting before startup
-    (as well as pre-reset data in debug mode).
+    (as well as pre-reset data in debug mode) and starts the background work:
+    the workers of the import and export jobs and the archiving of done tasks
+    (if it is enabled and the tasks are stored in Postgres).
 
     :param app_: FastAPI app.
     """
     logger.info("Start up.")
 
-    async with engine.begin() as conn:
-        if config.debug:
-            logger.debug("Debug mode.")
-            logger.warning("Drop db.")
-            await conn.run_sync(Base.metadata.drop_all)
-
-        await conn.run_sync(Base.metadata.create_all)
+    backend: StorageBackend = app_.state.storage_backend
+    if config.debug:
+        logger.debug("Debug mode.")
+        logger.warning("Drop db.")
+    await backend.open(reset=config.debug)
+
+    # Every shard archives its own tasks.
+    archiving: List[asyncio.Task] = []
+    if config.archive.enabled and isinstance(backend, SQLStorageBackend):
+        for session_maker in shard_sessions:
+            archiver = TaskArchiver(
+                session_maker,
+                age=timedelta(days=config.archive.age_days),
+                batch_size=config.archive.batch_size,
+            )
+            archiving.append(asyncio.create_task(archiver.run(config.archive.interval)))
+
+    job_runner = JobRunner(
+        backend.session,
+        workers=config.jobs.workers,
+        directory=config.jobs.directory,
+        batch_size=config.jobs.batch_size,
+        stale_after=config.jobs.stale_after,
+    )
+    app_.state.job_runner = job_runner
+    await job_runner.start()
 
     yield
 
     logger.info("Shut down.")
-    await engine.dispose()
+    await job_runner.stop()
+    for task in archiving:
+        task.cancel()
+    await backend.close()
+
+
+def create_storage_backend() -> StorageBackend:
+    """Create the storage backend chosen by the config."""
+    if config.storage.backend == "memory":
+        return MemoryStorageBackend(
+            config.storage.directory or None, config.storage.snapshot_every
+        )
+    return SQLStorageBackend(shard_sessions, engines)
 
 
 def create_app() -> FastAPI:
@@ -55,10 +102,15 @@ def create_app() -> FastAPI:
     app_ = FastAPI(
         lifespan=lifespan,
         openapi_tags=tags_metadata,
-        dependencies=[Depends(dependency_session)],
+        dependencies=[Depends(dependency_storage)],
     )
+    app_.state.storage_backend = create_storage_backend()
 
+    # The profiling middleware is the outer one, so it measures compression too.
+    app_.add_middleware(CompressionMiddleware, config=config.compression)
+    app_.add_middleware(ProfilingMiddleware, config=config.profiling)
     app_.include_router(task_router)
+    app_.include_router(job_router)
 
     return app_
 
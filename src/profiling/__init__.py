@@ -0,0 +1 @@
+"""The package responsible for profiling of the requests."""
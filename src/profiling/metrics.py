@@ -0,0 +1,173 @@
+"""
+The module responsible for measuring where the time of a request is spent.
+
+The metrics are collected only inside collect_metrics(), so outside of profiled
+requests and query budgets the instrumentation costs one ContextVar lookup.
+"""
+
+import logging
+import logging.handlers
+import warnings
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Parts of the request reported in the Server-Timing header: the queries,
+# decoding and validation of the request bodies, building the response models
+# from the rows and encoding the responses, and writing the log records.
+DB: str = "db"
+VALIDATION: str = "validation"
+SERIALIZATION: str = "serialization"
+LOGGING: str = "logging"
+
+# Transaction control is not a query of the app (and in tests every commit
+# of the session joined to the test transaction emits it), so it is not counted.
+NOT_COUNTED_STATEMENTS: Tuple[str, ...] = (
+    "SAVEPOINT",
+    "RELEASE SAVEPOINT",
+    "ROLLBACK TO SAVEPOINT",
+)
+
+
+class SQLBudgetError(Exception):
+    """The number of SQL statements exceeded the budget."""
+
+    pass
+
+
+class SQLBudgetWarning(UserWarning):
+    """The number of SQL statements exceeded the budget."""
+
+    pass
+
+
+@dataclass
+class RequestMetrics(object):
+    """Time (in seconds) spent in the parts of the app and number of SQL statements."""
+
+    durations: Dict[str, float] = field(default_factory=dict)
+    statements: int = 0
+
+    def add(self, name: str, seconds: float) -> None:
+        """Add the time spent in the part of the app."""
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+
+# Collectors can be nested (e.g. a query budget of a test around a request),
+# all active collectors receive the metrics.
+_collectors: ContextVar[Tuple[RequestMetrics, ...]] = ContextVar(
+    "request_metrics", default=()
+)
+
+
+@contextmanager
+def collect_metrics() -> Iterator[RequestMetrics]:
+    """Collect the metrics of the code inside the block."""
+    metrics = RequestMetrics()
+    token = _collectors.set(_collectors.get() + (metrics,))
+    try:
+        yield metrics
+    finally:
+        _collectors.reset(token)
+
+
+@contextmanager
+def timing(name: str) -> Iterator[None]:
+    """Add the time spent inside the block to the part of the app."""
+    collectors = _collectors.get()
+    if not collectors:
+        yield
+        return
+
+    start: float = perf_counter()
+    try:
+        yield
+    finally:
+        seconds: float = perf_counter() - start
+        for metrics in collectors:
+            metrics.add(name, seconds)
+
+
+def check_budget(
+    metrics: RequestMetrics, budget: int, mode: str, where: str
+) -> Optional[str]:
+    """
+    Check the number of SQL statements against the budget (0 - no budget).
+
+    If the budget is exceeded, raise SQLBudgetError in "fail" mode,
+    otherwise return the message for the warning.
+    """
+    if not budget or metrics.statements <= budget:
+        return None
+
+    message: str = (
+        f"{where} executed {metrics.statements} SQL statements, the budget is {budget}"
+    )
+    if mode == "fail":
+        raise SQLBudgetError(message)
+    return message
+
+
+@contextmanager
+def sql_budget(budget: int, mode: str = "fail") -> Iterator[RequestMetrics]:
+    """
+    Check the number of SQL statements executed inside the block (for tests).
+
+    In "warn" mode SQLBudgetWarning is issued instead of SQLBudgetError.
+    """
+    with collect_metrics() as metrics:
+        yield metrics
+
+    message: Optional[str] = check_budget(metrics, budget, mode, "The block")
+    if message is not None:
+        warnings.warn(message, SQLBudgetWarning, stacklevel=3)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Remember the start of the statement."""
+    if _collectors.get():
+        conn.info.setdefault("statement_start", []).append(perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Add the statement and its time to the metrics."""
+    collectors = _collectors.get()
+    starts = conn.info.get("statement_start")
+    if not collectors or not starts:
+        return
+
+    seconds: float = perf_counter() - starts.pop()
+    counted: bool = not statement.startswith(NOT_COUNTED_STATEMENTS)
+    for metrics in collectors:
+        metrics.add(DB, seconds)
+        metrics.statements += counted
+
+
+class TimedHandlerMixin(object):
+    """Adds the time spent by the logging handler to the metrics."""
+
+    def handle(self, record: logging.LogRecord) -> Any:
+        """Handle the record and measure the time."""
+        with timing(LOGGING):
+            return super().handle(record)  # type: ignore[misc]
+
+
+class TimedStreamHandler(TimedHandlerMixin, logging.StreamHandler):
+    """StreamHandler which time is reported in the metrics."""
+
+    pass
+
+
+class TimedRotatingFileHandler(
+    TimedHandlerMixin, logging.handlers.TimedRotatingFileHandler
+):
+    """TimedRotatingFileHandler which time is reported in the metrics."""
+
+    pass
@@ -0,0 +1,143 @@
+"""The module responsible for the middleware of profiling of the requests."""
+
+import cProfile
+import hmac
+import os
+import re
+from datetime import datetime
+from logging import getLogger
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Dict, MutableMapping, Optional
+
+from src.config.app_config import Profiling
+
+from .metrics import (
+    DB,
+    LOGGING,
+    SERIALIZATION,
+    VALIDATION,
+    RequestMetrics,
+    check_budget,
+    collect_metrics,
+)
+
+logger = getLogger("main_logger.profiling")
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+PROFILE_HEADER: bytes = b"x-profile"
+
+
+def server_timing(metrics: RequestMetrics, total: float) -> str:
+    """
+    Return the value of the Server-Timing header (durations in milliseconds).
+
+    "app" is the rest of the time: routing, FastAPI's own validation
+    of the parameters and of the bodies of single tasks, etc.
+    """
+    parts: Dict[str, float] = {
+        name: metrics.durations.get(name, 0.0)
+        for name in (DB, VALIDATION, SERIALIZATION, LOGGING)
+    }
+    parts["app"] = max(total - sum(parts.values()), 0.0)
+    entries = [
+        f'{DB};desc="{metrics.statements} statements";dur={parts.pop(DB) * 1000:.2f}'
+    ]
+    entries += [f"{name};dur={seconds * 1000:.2f}" for name, seconds in parts.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+class ProfilingMiddleware(object):
+    """
+    Profiles the requests which send the X-Profile header with the token.
+
+    The cProfile profile of such a request is saved to the directory
+    (it can be turned into a flame graph by flameprof or viewed by snakeviz),
+    and the Server-Timing header is added to the response. The profiler sees
+    everything the event loop runs meanwhile, so the profiled requests should
+    not be mixed with a heavy load. Only one request is profiled at a time.
+
+    Every request (not only the profiled ones) is checked against the budget
+    of SQL statements if it is set.
+    """
+
+    def __init__(self, app: ASGIApp, config: Profiling):
+        """Initialize class."""
+        self.app = app
+        self.config = config
+        self._profiling: bool = False
+
+    def _authorised(self, scope: Scope) -> bool:
+        """Check that the request asks for profiling with the valid token."""
+        if not self.config.enabled or not self.config.token:
+            return False
+
+        for name, value in scope.get("headers", []):
+            if name == PROFILE_HEADER:
+                return hmac.compare_digest(value, self.config.token.encode())
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Run the request with the metrics (and the profiler if it is requested)."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profiled: bool = self._authorised(scope) and not self._profiling
+        if not profiled and not self.config.sql_budget:
+            await self.app(scope, receive, send)
+            return
+
+        start: float = perf_counter()
+        where: str = f"{scope['method']} {scope['path']}"
+
+        with collect_metrics() as metrics:
+
+            async def send_with_metrics(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    warning: Optional[str] = check_budget(
+                        metrics,
+                        self.config.sql_budget,
+                        self.config.sql_budget_mode,
+                        where,
+                    )
+                    if warning is not None:
+                        logger.warning(warning)
+                    if profiled:
+                        timing_header: str = server_timing(
+                            metrics, perf_counter() - start
+                        )
+                        message["headers"] = list(message.get("headers", [])) + [
+                            (b"server-timing", timing_header.encode())
+                        ]
+                await send(message)
+
+            if not profiled:
+                await self.app(scope, receive, send_with_metrics)
+                return
+
+            self._profiling = True
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await self.app(scope, receive, send_with_metrics)
+            finally:
+                profile.disable()
+                self._profiling = False
+                self._save(profile, scope)
+
+    def _save(self, profile: cProfile.Profile, scope: Scope) -> str:
+        """Save the profile of the request to the directory and return the path."""
+        os.makedirs(self.config.directory, exist_ok=True)
+        name: str = re.sub(r"[^\w]+", "_", f"{scope['method']}{scope['path']}")
+        path: str = os.path.join(
+            self.config.directory, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{name}.prof"
+        )
+        profile.dump_stats(path)
+        logger.info("Saved the profile of the request to %s", path)
+        return path
@@ -0,0 +1,195 @@
+"""The module responsible for the endpoints related to the import and export jobs."""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Annotated, Any, Dict, Optional, Tuple
+
+from fastapi import APIRouter, Path, Request, Response
+from fastapi.responses import FileResponse
+
+from src.jobs.runner import JobRunner
+from src.schemas import formats
+from src.schemas.schemas import MAX_JOB_ID, STATUSES, JobOutSchema
+from src.storage.base import JobStorage
+
+logger = logging.getLogger("main_logger.router")
+
+router: APIRouter = APIRouter(
+    tags=["jobs"],
+)
+
+JobIdPath = Annotated[int, Path(ge=1, le=MAX_JOB_ID, description="Id of the job")]
+
+file_formats: Dict[str, Any] = {
+    media_type: {} for media_type in formats.FILE_MEDIA_TYPES
+}
+
+# The received chunks are written to the file in a thread by pieces of this size.
+UPLOAD_BUFFER_SIZE: int = 1024 * 1024
+
+
+def _job_response(job: JobOutSchema) -> JobOutSchema:
+    """Add the url of the exported file to the finished export job."""
+    if job.kind == "export" and job.status == "done":
+        job.result = f"/jobs/{job.id}/result/"
+    return job
+
+
+@router.post(
+    "/tasks/import/",
+    status_code=202,
+    openapi_extra={"requestBody": {"content": file_formats}},
+    responses={
+        202: {
+            "description": "The import job was created",
+            "content": {"application/json": {"example": {"msg": "OK", "job_id": 1}}},
+        },
+        415: {
+            "description": "Unsupported format.",
+            "content": {
+                "application/json": {"example": {"msg": "Unsupported media type"}}
+            },
+        },
+    },
+)
+async def import_tasks(request: Request):
+    """
+    Upload NDJSON or CSV file with tasks and create a job that imports them.
+
+    The file is saved as it is received (written in a thread, so other
+    requests are not blocked), the tasks are validated and imported
+    in the background, the progress can be received by GET /jobs/{idx}/.
+    """
+    media_type: str = formats.media_type_of(request.headers.get("content-type"))
+    if media_type not in formats.FILE_MEDIA_TYPES:
+        logger.warning("Unsupported media type %s received.", media_type)
+        return Response(
+            status_code=415,
+            content=json.dumps({"msg": "Unsupported media type"}),
+            media_type="application/json",
+        )
+
+    runner: JobRunner = request.app.state.job_runner
+    path: str = runner.new_path("import", media_type)
+    file = await asyncio.to_thread(open, path, "wb")
+    try:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer += chunk
+            if len(buffer) >= UPLOAD_BUFFER_SIZE:
+                await asyncio.to_thread(file.write, bytes(buffer))
+                buffer.clear()
+        await asyncio.to_thread(file.write, bytes(buffer))
+    finally:
+        await asyncio.to_thread(file.close)
+
+    job_rep: JobStorage = request.state.storage.jobs
+    job_id: int = await job_rep.create("import", media_type, path)
+    runner.submit(job_id)
+
+    logger.info("Created an import job with id %d", job_id)
+
+    return {"msg": "OK", "job_id": job_id}
+
+
+@router.post(
+    "/tasks/export/",
+    status_code=202,
+    responses={
+        202: {
+            "description": "The export job was created",
+            "content": {"application/json": {"example": {"msg": "OK", "job_id": 1}}},
+        },
+        400: {
+            "description": "Not such status or format.",
+            "content": {"application/json": {"example": {"msg": "Invalid status"}}},
+        },
+    },
+)
+async def export_tasks(
+    request: Request, status: Optional[str] = None, media_type: str = formats.CSV
+):
+    """Create a job that exports all tasks (or all tasks with the status) to a file."""
+    if status is not None and status not in STATUSES:
+        logger.warning("Invalid status received.")
+        return Response(
+            status_code=400,
+            content=json.dumps({"msg": "Invalid status"}),
+            media_type="application/json",
+        )
+    if media_type not in formats.FILE_MEDIA_TYPES:
+        logger.warning("Invalid export format received.")
+        return Response(
+            status_code=400,
+            content=json.dumps({"msg": "Invalid format"}),
+            media_type="application/json",
+        )
+
+    runner: JobRunner = request.app.state.job_runner
+    job_rep: JobStorage = request.state.storage.jobs
+    job_id: int = await job_rep.create(
+        "export", media_type, runner.new_path("export", media_type), status
+    )
+    runner.submit(job_id)
+
+    logger.info("Created an export job with id %d", job_id)
+
+    return {"msg": "OK", "job_id": job_id}
+
+
+@router.get(
+    "/jobs/{idx}/",
+    status_code=200,
+    response_model=JobOutSchema,
+    responses={
+        404: {
+            "description": "Job not found.",
+            "content": {"application/json": {"example": {"msg": "Not found"}}},
+        },
+    },
+)
+async def get_job(request: Request, idx: JobIdPath):
+    """Get the status and the progress of the job."""
+    job_rep: JobStorage = request.state.storage.jobs
+    result: Optional[JobOutSchema] = await job_rep.get(idx)
+    if result is None:
+        logger.warning("Job with id %d not found.", idx)
+        return Response(
+            status_code=404,
+            content=json.dumps({"msg": "Not found"}),
+            media_type="application/json",
+        )
+
+    logger.info("Return the job with id %d", idx)
+    return _job_response(result)
+
+
+@router.get(
+    "/jobs/{idx}/result/",
+    status_code=200,
+    response_class=FileResponse,
+    responses={
+        200: {"content": file_formats},
+        404: {
+            "description": "Job not found or not finished.",
+            "content": {"application/json": {"example": {"msg": "Not found"}}},
+        },
+    },
+)
+async def get_job_result(request: Request, idx: JobIdPath):
+    """Download the file of the finished export job."""
+    job_rep: JobStorage = request.state.storage.jobs
+    result: Optional[Tuple[str, str]] = await job_rep.get_result(idx)
+    if result is None or not os.path.exists(result[0]):
+        logger.warning("Result of the job with id %d not found.", idx)
+        return Response(
+            status_code=404,
+            content=json.dumps({"msg": "Not found"}),
+            media_type="application/json",
+        )
+
+    path, media_type = result
+    logger.info("Return the result of the job with id %d", idx)
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
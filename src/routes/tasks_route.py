@@ -2,13 +2,23 @@
 
 import json
 import logging
-from typing import List, Optional
+from typing import Annotated, Any, Dict, List, Optional, Union
 
-from fastapi import APIRouter, Request, Response
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Header, Path, Request, Response
+from pydantic import TypeAdapter
 
-from src.db.repositories import TaskRepository
-from src.schemas.schemas import STATUSES, TaskInSchema, TaskOutSchema
+from src.profiling.metrics import SERIALIZATION, VALIDATION, timing
+from src.schemas import formats
+from src.schemas.schemas import (
+    MAX_QUERY_TASK_IDS,
+    MAX_TASK_ID,
+    STATUSES,
+    TaskBatchOutSchema,
+    TaskIdsInSchema,
+    TaskInSchema,
+    TaskOutSchema,
+)
+from src.storage.base import TaskStorage
 
 logger = logging.getLogger("main_logger.router")
 
@@ -16,6 +26,33 @@ router: APIRouter = APIRouter(
     tags=["tasks"],
 )
 
+TaskIdPath = Annotated[int, Path(ge=1, le=MAX_TASK_ID, description="Id of the task")]
+
+tasks_in_adapter: TypeAdapter[List[TaskInSchema]] = TypeAdapter(List[TaskInSchema])
+other_formats: Dict[str, Any] = {
+    media_type: {} for media_type in formats.MEDIA_TYPES if media_type != formats.JSON
+}
+not_acceptable_response: Dict[str, Any] = {
+    "description": "None of the supported formats is acceptable.",
+    "content": {"application/json": {"example": {"msg": "Not acceptable"}}},
+}
+
+
+def _vary_accept(response: Response) -> Response:
+    """Mark the response as depending on the Accept header (for shared caches)."""
+    response.headers["Vary"] = "Accept"
+    return response
+
+
+def _not_acceptable() -> Response:
+    """Return the response for an Accept header without supported formats."""
+    logger.warning("Not acceptable media type requested.")
+    return Response(
+        status_code=406,
+        content=json.dumps({"msg": "Not acceptable"}),
+        media_type="application/json",
+    )
+
 
 @router.post(
     "/tasks/",
@@ -27,39 +64,166 @@ router: APIRouter = APIRouter(
         },
     },
 )
-async def create_task(request: Request, task: TaskInSchema):
-    """Create a new task."""
-    session: AsyncSession = request.state.session
-    task_rep: TaskRepository = TaskRepository(session)
-    task_id: int = await task_rep.create(task)
+async def create_task(
+    request: Request,
+    task: TaskInSchema,
+    x_shard_key: Optional[str] = Header(default=None),
+):
+    """
+    Create a new task.
+
+    Tasks with the same X-Shard-Key header are stored in the same shard,
+    without the header the shard is chosen randomly.
+    """
+    task_rep: TaskStorage = request.state.storage.tasks
+    task_id: int = await task_rep.create(task, x_shard_key)
 
     logger.info("Created a new task with id %d", task_id)
 
     return {"msg": "OK", "task_id": task_id}
 
 
+@router.post(
+    "/tasks/bulk/",
+    status_code=201,
+    openapi_extra={
+        "requestBody": {
+            "content": {media_type: {} for media_type in formats.MEDIA_TYPES},
+        },
+    },
+    responses={
+        201: {
+            "description": "The tasks were created",
+            "content": {
+                "application/json": {"example": {"msg": "OK", "task_ids": [1, 2]}}
+            },
+        },
+        415: {
+            "description": "Unsupported format.",
+            "content": {
+                "application/json": {"example": {"msg": "Unsupported media type"}}
+            },
+        },
+        422: {
+            "description": "Invalid data.",
+            "content": {"application/json": {"example": {"msg": "Invalid data"}}},
+        },
+    },
+)
+async def create_tasks(
+    request: Request, x_shard_key: Optional[str] = Header(default=None)
+):
+    """
+    Create many tasks.
+
+    The list of tasks can be sent in any of the formats of GET /tasks/,
+    the format is chosen by the Content-Type header.
+    With the X-Shard-Key header all tasks are stored in the same shard.
+    """
+    content_type: Optional[str] = request.headers.get("content-type")
+    if not formats.is_supported(content_type):
+        logger.warning("Unsupported media type %s received.", content_type)
+        return Response(
+            status_code=415,
+            content=json.dumps({"msg": "Unsupported media type"}),
+            media_type="application/json",
+        )
+
+    body: bytes = await request.body()
+    try:
+        with timing(VALIDATION):
+            tasks: List[TaskInSchema] = tasks_in_adapter.validate_python(
+                formats.decode_tasks(body, content_type)
+            )
+    except ValueError:
+        logger.warning("Invalid tasks received.")
+        return Response(
+            status_code=422,
+            content=json.dumps({"msg": "Invalid data"}),
+            media_type="application/json",
+        )
+
+    task_rep: TaskStorage = request.state.storage.tasks
+    task_ids: List[int] = await task_rep.create_many(tasks, x_shard_key)
+
+    logger.info("Created %d new tasks.", len(task_ids))
+
+    return {"msg": "OK", "task_ids": task_ids}
+
+
 @router.get(
     "/tasks/",
     status_code=200,
-    response_model=List[TaskOutSchema],
+    response_model=Union[List[TaskOutSchema], TaskBatchOutSchema],
     responses={
+        200: {"content": other_formats},
         400: {
-            "description": "Not such status.",
+            "description": "Not such status or invalid ids.",
             "content": {"application/json": {"example": {"msg": "Invalid status"}}},
         },
+        406: not_acceptable_response,
     },
 )
-async def get_all_tasks(request: Request, status: Optional[str] = None):
-    """Get all tasks (or all tasks with the status)."""
-    session: AsyncSession = request.state.session
-    task_rep: TaskRepository = TaskRepository(session)
+async def get_all_tasks(
+    request: Request,
+    status: Optional[str] = None,
+    include_archived: bool = False,
+    ids: Optional[str] = None,
+):
+    """
+    Get all tasks (or all tasks with the status), optionally with archived ones.
+
+    If ids (comma separated, at most MAX_QUERY_TASK_IDS) are passed, return the tasks
+    with these ids (archived ones included) and the ids of the tasks that were
+    not found, always as JSON; the status cannot be passed with them.
+    Otherwise, the format of the list is chosen by the Accept header.
+    """
+    return _vary_accept(await _get_all_tasks(request, status, include_archived, ids))
 
-    if status is None:
+
+async def _get_all_tasks(
+    request: Request,
+    status: Optional[str],
+    include_archived: bool,
+    ids: Optional[str],
+) -> Response:
+    """Get the tasks for GET /tasks/."""
+    task_rep: TaskStorage = request.state.storage.tasks
+    media_type: Optional[str] = formats.negotiate(request.headers.get("accept"))
+
+    if ids is not None:
+        if formats.negotiate(request.headers.get("accept"), (formats.JSON,)) is None:
+            return _not_acceptable()
+        if status is not None:
+            logger.warning("Status received with ids.")
+            return Response(
+                status_code=400,
+                content=json.dumps({"msg": "Status cannot be used with ids"}),
+                media_type="application/json",
+            )
+        try:
+            ids_list: List[int] = [int(idx) for idx in ids.split(",") if idx.strip()]
+            valid: bool = len(ids_list) <= MAX_QUERY_TASK_IDS and all(
+                1 <= idx <= MAX_TASK_ID for idx in ids_list
+            )
+        except ValueError:
+            valid = False
+        if not valid:
+            logger.warning("Invalid ids received.")
+            return Response(
+                status_code=400,
+                content=json.dumps({"msg": "Invalid ids"}),
+                media_type="application/json",
+            )
+        return await _get_many_tasks(task_rep, ids_list)
+    elif media_type is None:
+        return _not_acceptable()
+    elif status is None:
         logger.info("Returned all tasks.")
-        return await task_rep.get_all()
+        tasks: List[TaskOutSchema] = await task_rep.get_all(include_archived)
     elif status in STATUSES:
         logger.info("Returned all tasks with status %s.", status)
-        return await task_rep.get_all_by_status(status)
+        tasks = await task_rep.get_all_by_status(status, include_archived)
     else:
         logger.warning("Invalid status received.")
         return Response(
@@ -68,22 +232,63 @@ async def get_all_tasks(request: Request, status: Optional[str] = None):
             media_type="application/json",
         )
 
+    with timing(SERIALIZATION):
+        content: bytes = formats.encode_tasks(tasks, media_type)
+    return Response(content=content, media_type=media_type)
+
+
+@router.post(
+    "/tasks/batch-get/",
+    status_code=200,
+    response_model=TaskBatchOutSchema,
+)
+async def batch_get_tasks(request: Request, task_ids: TaskIdsInSchema):
+    """Get the tasks by the list of ids (for lists too long for the query string)."""
+    task_rep: TaskStorage = request.state.storage.tasks
+
+    return await _get_many_tasks(task_rep, task_ids.ids)
+
+
+async def _get_many_tasks(task_rep: TaskStorage, ids: List[int]) -> Response:
+    """Get the tasks by ids and log the ids that were not found."""
+    tasks, missing = await task_rep.get_many(ids)
+    if missing:
+        logger.warning("Tasks with ids %s not found.", missing)
+
+    logger.info("Returned %d tasks by ids.", len(tasks))
+    with timing(SERIALIZATION):
+        content: bytes = (
+            TaskBatchOutSchema.model_construct(tasks=tasks, missing=missing)
+            .model_dump_json()
+            .encode()
+        )
+    return Response(content=content, media_type=formats.JSON)
+
 
 @router.get(
     "/tasks/{idx}/",
     status_code=200,
     response_model=TaskOutSchema,
     responses={
+        200: {"content": other_formats},
         404: {
             "description": "Task not found.",
             "content": {"application/json": {"example": {"msg": "Not found"}}},
         },
+        406: not_acceptable_response,
     },
 )
-async def get_task(request: Request, idx: int):
-    """Get task by id."""
-    session: AsyncSession = request.state.session
-    task_rep: TaskRepository = TaskRepository(session)
+async def get_task(request: Request, idx: TaskIdPath):
+    """Get task by id in the format chosen by the Accept header."""
+    return _vary_accept(await _get_task(request, idx))
+
+
+async def _get_task(request: Request, idx: int) -> Response:
+    """Get the task for GET /tasks/{idx}/."""
+    task_rep: TaskStorage = request.state.storage.tasks
+    media_type: Optional[str] = formats.negotiate(request.headers.get("accept"))
+    if media_type is None:
+        return _not_acceptable()
 
     result: Optional[TaskOutSchema] = await task_rep.get(idx)
     if result is None:
@@ -95,7 +300,9 @@ async def get_task(request: Request, idx: int):
         )
 
     logger.info("Return the task with id %d", idx)
-    return result
+    with timing(SERIALIZATION):
+        content: bytes = formats.encode_task(result, media_type)
+    return Response(content=content, media_type=media_type)
 
 
 @router.put(
@@ -112,10 +319,9 @@ async def get_task(request: Request, idx: int):
         },
     },
 )
-async def update_task(request: Request, idx: int, task_in: TaskInSchema):
+async def update_task(request: Request, idx: TaskIdPath, task_in: TaskInSchema):
     """Update the task."""
-    session: AsyncSession = request.state.session
-    task_rep: TaskRepository = TaskRepository(session)
+    task_rep: TaskStorage = request.state.storage.tasks
 
     try:
         await task_rep.update(idx, task_in)
@@ -144,10 +350,9 @@ async def update_task(request: Request, idx: int, task_in: TaskInSchema):
         },
     },
 )
-async def delete_task(request: Request, idx: int):
+async def delete_task(request: Request, idx: TaskIdPath):
     """Delete the task."""
-    session: AsyncSession = request.state.session
-    task_rep: TaskRepository = TaskRepository(session)
+    task_rep: TaskStorage = request.state.storage.tasks
 
     try:
         await task_rep.delete(idx)
@@ -0,0 +1,234 @@
+"""
+The module responsible for encoding and decoding tasks in the supported media types.
+
+Besides JSON, tasks can be sent as MessagePack and in the column-oriented form
+({"id": [...], "title": [...], ...}) as JSON, MessagePack or CSV.
+Files of the import and export jobs are read and written row by row
+as NDJSON or CSV.
+"""
+
+import csv
+import io
+import json
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+)
+
+import msgpack
+from pydantic import TypeAdapter
+
+from .schemas import TaskOutSchema
+
+JSON: str = "application/json"
+MSGPACK: str = "application/msgpack"
+COLUMNS_JSON: str = "application/vnd.columns+json"
+COLUMNS_MSGPACK: str = "application/vnd.columns+msgpack"
+CSV: str = "text/csv"
+NDJSON: str = "application/x-ndjson"
+
+# In the order of preference of the server.
+MEDIA_TYPES: Tuple[str, ...] = (JSON, MSGPACK, COLUMNS_JSON, COLUMNS_MSGPACK, CSV)
+ALIASES: Dict[str, str] = {"application/x-msgpack": MSGPACK}
+COLUMNS: Tuple[str, ...] = ("id", "title", "description", "status")
+
+FILE_MEDIA_TYPES: Dict[str, str] = {NDJSON: "ndjson", CSV: "csv"}
+
+tasks_out_adapter: TypeAdapter[List[TaskOutSchema]] = TypeAdapter(List[TaskOutSchema])
+
+
+def _media_type(value: str) -> str:
+    """Return the media type without parameters, in lower case and unaliased."""
+    media_type: str = value.split(";", 1)[0].strip().lower()
+    return ALIASES.get(media_type, media_type)
+
+
+def media_type_of(content_type: Optional[str]) -> str:
+    """Return the media type of the Content-Type header (JSON if it is missing)."""
+    return _media_type(content_type or JSON)
+
+
+def is_supported(content_type: Optional[str]) -> bool:
+    """Check that tasks can be decoded from the body of the content type."""
+    return _media_type(content_type or JSON) in MEDIA_TYPES
+
+
+def _parse_accept(accept: str) -> Dict[str, float]:
+    """Return the quality values of the media ranges of the Accept header."""
+    qualities: Dict[str, float] = {}
+    for item in accept.split(","):
+        media_range, *params = item.split(";")
+        q: float = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[_media_type(media_range)] = q
+    return qualities
+
+
+def negotiate(
+    accept: Optional[str], media_types: Sequence[str] = MEDIA_TYPES
+) -> Optional[str]:
+    """
+    Choose the media type of the response (one of media_types) by the Accept header.
+
+    The quality of every supported media type is taken from the most specific
+    range that matches it, so a type rejected with q=0 is not chosen by a wildcard.
+    Media types with the same quality are chosen in the order of media_types.
+    Return None if none of the supported media types is acceptable.
+    """
+    if not accept:
+        return JSON
+
+    qualities: Dict[str, float] = _parse_accept(accept)
+    best: Optional[str] = None
+    best_q: float = 0.0
+    for media_type in media_types:
+        type_range: str = media_type.split("/", 1)[0] + "/*"
+        q: float = qualities.get(
+            media_type, qualities.get(type_range, qualities.get("*/*", 0.0))
+        )
+        if q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+def _to_columns(rows: Sequence[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Convert the list of rows to the column-oriented form."""
+    return {column: [row[column] for row in rows] for column in COLUMNS}
+
+
+def _from_columns(columns: Any) -> List[Dict[str, Any]]:
+    """
+    Convert the column-oriented form to the list of rows.
+
+    Raise ValueError if the body is not a dict of columns of the same length.
+    """
+    if not isinstance(columns, dict) or not all(
+        isinstance(values, list) for values in columns.values()
+    ):
+        raise ValueError("Expected a dict of columns")
+    if len({len(values) for values in columns.values()}) > 1:
+        raise ValueError("The columns have different lengths")
+
+    names: List[str] = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+def _read_csv(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Read the rows of the CSV with the header.
+
+    Raise ValueError if the CSV is malformed (e.g. a field is too large)
+    or a row has more values than the header.
+    """
+    reader = csv.DictReader(lines)
+    try:
+        for row in reader:
+            if None in row:
+                raise ValueError(
+                    f"Malformed line {reader.line_num}: more values than columns"
+                )
+            yield row
+    except csv.Error as exc:
+        raise ValueError(f"Malformed line {reader.line_num}: {exc}") from exc
+
+
+def encode_tasks(tasks: Sequence[TaskOutSchema], media_type: str) -> bytes:
+    """Encode the list of tasks in the media type."""
+    if media_type == JSON:
+        return tasks_out_adapter.dump_json(list(tasks))
+
+    rows: List[Dict[str, Any]] = [task.model_dump() for task in tasks]
+    if media_type == MSGPACK:
+        return msgpack.packb(rows)
+    elif media_type == COLUMNS_JSON:
+        return json.dumps(_to_columns(rows)).encode()
+    elif media_type == COLUMNS_MSGPACK:
+        return msgpack.packb(_to_columns(rows))
+    elif media_type == CSV:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+        return buffer.getvalue().encode()
+    raise ValueError(f"Unsupported media type {media_type}")
+
+
+def encode_task(task: TaskOutSchema, media_type: str) -> bytes:
+    """Encode one task (as an object or as a table with one row)."""
+    if media_type == JSON:
+        return task.model_dump_json().encode()
+    elif media_type == MSGPACK:
+        return msgpack.packb(task.model_dump())
+    return encode_tasks([task], media_type)
+
+
+def decode_tasks(body: bytes, content_type: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Decode the list of tasks (as dicts, not validated) from the body.
+
+    Raise ValueError if the media type is not supported or the body is malformed.
+    """
+    media_type: str = _media_type(content_type or JSON)
+    if media_type not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported media type {media_type}")
+
+    try:
+        if media_type == CSV:
+            return list(_read_csv(io.StringIO(body.decode())))
+        elif media_type in (JSON, COLUMNS_JSON):
+            data: Any = json.loads(body)
+        else:
+            data = msgpack.unpackb(body)
+
+        if media_type in (COLUMNS_JSON, COLUMNS_MSGPACK):
+            return _from_columns(data)
+    except (ValueError, TypeError, AttributeError, msgpack.UnpackException) as exc:
+        raise ValueError(f"Malformed body: {exc}") from exc
+
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of tasks")
+    return data
+
+
+def read_rows(lines: Iterable[str], media_type: str) -> Iterator[Dict[str, Any]]:
+    """Read tasks (as dicts, not validated) one by one from the NDJSON or CSV file."""
+    if media_type == CSV:
+        yield from _read_csv(lines)
+        return
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row: Any = json.loads(line)
+        except ValueError as exc:
+            raise ValueError(f"Malformed line {number}: {exc}") from exc
+        if not isinstance(row, dict):
+            raise ValueError(f"Malformed line {number}: expected an object")
+        yield row
+
+
+def write_rows(
+    file: TextIO, rows: Sequence[Dict[str, Any]], media_type: str, header: bool
+) -> None:
+    """Write tasks to the NDJSON or CSV file (with the CSV header if header)."""
+    if media_type == CSV:
+        writer = csv.DictWriter(file, fieldnames=COLUMNS, extrasaction="ignore")
+        if header:
+            writer.writeheader()
+        writer.writerows(rows)
+    else:
+        file.writelines(json.dumps(row) + "\n" for row in rows)
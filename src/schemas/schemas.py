@@ -1,6 +1,6 @@
 """The module responsible for pydantic schemes."""
 
-from typing import Any
+from typing import Annotated, Any, List, Optional
 
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 
@@ -10,6 +10,30 @@ STATUSES = {
     "done",
 }
 
+JOB_KINDS = {
+    "import",
+    "export",
+}
+
+JOB_STATUSES = {
+    "pending",
+    "running",
+    "done",
+    "failed",
+}
+
+# The ids of the tasks are stored as BIGINT.
+MAX_TASK_ID: int = 2**63 - 1
+# The ids of the jobs are stored as INTEGER.
+MAX_JOB_ID: int = 2**31 - 1
+# The maximum numbers of ids in one request of the tasks by ids: the query
+# string is limited by the length of the URL, the body is sent for long lists
+# (the ids are one array parameter of the query for any number of them).
+MAX_QUERY_TASK_IDS: int = 500
+MAX_BATCH_TASK_IDS: int = 100000
+
+TaskId = Annotated[int, Field(ge=1, le=MAX_TASK_ID)]
+
 
 class TaskSchema(BaseModel):
     """Base task schema."""
@@ -43,3 +67,36 @@ class TaskOutSchema(TaskSchema):
 
     model_config = ConfigDict(from_attributes=True)
     id: int
+
+
+class TaskIdsInSchema(BaseModel):
+    """The schema of the list of task ids that comes from the client."""
+
+    ids: List[TaskId] = Field(
+        ..., max_length=MAX_BATCH_TASK_IDS, description="Ids of the tasks"
+    )
+
+
+class TaskBatchOutSchema(BaseModel):
+    """The schema of the tasks found by the list of ids."""
+
+    tasks: List[TaskOutSchema] = Field(..., description="Found tasks")
+    missing: List[int] = Field(..., description="Ids of the tasks that were not found")
+
+
+class JobOutSchema(BaseModel):
+    """The schema of the import or export job that the server returns."""
+
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    kind: str = Field(..., description=f"The kind of the job: {JOB_KINDS}")
+    status: str = Field(..., description=f"The status of the job: {JOB_STATUSES}")
+    media_type: str = Field(..., description="The format of the file")
+    processed: int = Field(..., description="Number of tasks processed so far")
+    total: Optional[int] = Field(
+        None, description="Number of tasks to process (if known in advance)"
+    )
+    error: Optional[str] = Field(None, description="The error if the job failed")
+    result: Optional[str] = Field(
+        None, description="The url of the exported file when the export is done"
+    )
@@ -0,0 +1 @@
+"""The package responsible for the storage backends of tasks and jobs."""
@@ -0,0 +1,214 @@
+"""
+The module responsible for the interface of the storage backends.
+
+The routes and the jobs work with tasks and jobs only through TaskStorage
+and JobStorage, so the data can be kept in Postgres (src.storage.sql)
+or in the memory of the process (src.storage.memory).
+"""
+
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from logging import getLogger
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncGenerator,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+)
+
+from fastapi import Request
+
+from src.schemas.schemas import JobOutSchema, TaskInSchema, TaskOutSchema
+
+logger = getLogger("main_logger.storage")
+
+
+class TaskStorage(ABC):
+    """
+    The interface of the storages of tasks.
+
+    Methods that change a task by id raise ValueError if the task is not found.
+    """
+
+    not_found_error_str: str = "The task not found"
+
+    @abstractmethod
+    async def create(self, data: TaskInSchema, shard_key: Optional[str] = None) -> int:
+        """Create a new item and return its id."""
+
+    @abstractmethod
+    async def create_many(
+        self, data: Sequence[TaskInSchema], shard_key: Optional[str] = None
+    ) -> List[int]:
+        """Create new items and return their ids in the order of data."""
+
+    @abstractmethod
+    async def get_all(self, include_archived: bool = False) -> List[TaskOutSchema]:
+        """Get all items ordered by id (including the archived ones if any)."""
+
+    @abstractmethod
+    async def get(self, idx: int) -> Optional[TaskOutSchema]:
+        """Get the item by id. If item not found - return None."""
+
+    @abstractmethod
+    async def get_many(
+        self, ids: Sequence[int]
+    ) -> Tuple[List[TaskOutSchema], List[int]]:
+        """Get the items by ids and the ids that were not found, in the order of ids."""
+
+    @abstractmethod
+    async def update(self, item_id: int, data: TaskInSchema) -> None:
+        """Update the item by id."""
+
+    @abstractmethod
+    async def delete(self, item_id: int) -> None:
+        """Delete the item by id."""
+
+    @abstractmethod
+    async def get_all_by_status(
+        self, status: str, include_archived: bool = False
+    ) -> List[TaskOutSchema]:
+        """Get all tasks with status ordered by id."""
+
+    @abstractmethod
+    async def count(self, status: Optional[str] = None) -> int:
+        """Count the tasks (with the status, if any)."""
+
+    @abstractmethod
+    def iter_batches(
+        self, status: Optional[str], batch_size: int
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Iterate over the tasks (with the status, if any) in batches of rows."""
+
+    async def import_many(self, data: Sequence[TaskInSchema]) -> None:
+        """Save the batch of imported tasks (the fastest way of the backend)."""
+        await self.create_many(data)
+
+
+class JobData(Protocol):
+    """The attributes of the job that are needed to run it."""
+
+    @property
+    def id(self) -> int:
+        """Return the id of the job."""
+
+    @property
+    def kind(self) -> str:
+        """Return the kind of the job."""
+
+    @property
+    def media_type(self) -> str:
+        """Return the format of the file of the job."""
+
+    @property
+    def task_status(self) -> Optional[str]:
+        """Return the status of the exported tasks."""
+
+    @property
+    def path(self) -> str:
+        """Return the path of the file of the job."""
+
+
+class JobStorage(ABC):
+    """The interface of the storages of the import and export jobs."""
+
+    not_found_error_str: str = "The job not found"
+
+    @abstractmethod
+    async def create(
+        self, kind: str, media_type: str, path: str, task_status: Optional[str] = None
+    ) -> int:
+        """Create a new pending job."""
+
+    @abstractmethod
+    async def get(self, idx: int) -> Optional[JobOutSchema]:
+        """Get the job by id. If job not found - return None."""
+
+    @abstractmethod
+    async def get_result(self, idx: int) -> Optional[Tuple[str, str]]:
+        """Get the path and the format of the file of the finished export job."""
+
+    @abstractmethod
+    async def get_pending_ids(self) -> List[int]:
+        """Get ids of the jobs which have not been started yet."""
+
+    @abstractmethod
+    async def start(self, idx: int) -> Optional[JobData]:
+        """Mark the pending job as running and return it (None if it is not pending)."""
+
+    @abstractmethod
+    async def progress(
+        self, idx: int, processed: int, total: Optional[int] = None
+    ) -> None:
+        """Save the progress of the job."""
+
+    @abstractmethod
+    async def finish(self, idx: int) -> None:
+        """Mark the job as done."""
+
+    @abstractmethod
+    async def fail(self, idx: int, error: str) -> None:
+        """Mark the job as failed with the error."""
+
+    @abstractmethod
+    async def fail_stale(
+        self, age: timedelta, error: str, exclude: Sequence[int] = ()
+    ) -> List[int]:
+        """
+        Mark the running jobs which have not been updated for age as failed.
+
+        Return their ids. The jobs with ids from exclude are not touched.
+        """
+
+
+class StorageSession(object):
+    """
+    The storages of tasks and jobs used by one request or one job.
+
+    Args:
+        tasks (TaskStorage) - the storage of tasks.
+        jobs (JobStorage) - the storage of jobs.
+    """
+
+    def __init__(self, tasks: TaskStorage, jobs: JobStorage):
+        """Initialize class."""
+        self.tasks = tasks
+        self.jobs = jobs
+
+    async def rollback(self) -> None:
+        """Discard the changes which are not saved yet (if the backend allows it)."""
+
+
+class StorageBackend(ABC):
+    """The storage backend of the app."""
+
+    @abstractmethod
+    async def open(self, reset: bool = False) -> None:
+        """Prepare the storage on startup (and delete all data if reset)."""
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Release the resources of the storage on shutdown."""
+
+    @abstractmethod
+    def session(self) -> AsyncContextManager[StorageSession]:
+        """Open the storage session for a request or a job."""
+
+
+async def dependency_storage(request: Request) -> AsyncGenerator[StorageSession, Any]:
+    """Open the storage session of the app and save it to request.state.storage."""
+    backend: StorageBackend = request.app.state.storage_backend
+    async with backend.session() as storage:
+        try:
+            request.state.storage = storage
+            yield storage
+        except Exception as exc:
+            logger.exception(str(exc))
+            await storage.rollback()
+            raise exc
@@ -0,0 +1,530 @@
+"""
+The module responsible for the in-memory storage backend.
+
+It is meant for edge and ephemeral instances, where the round trips to Postgres
+dominate the latency, and for running the tests and benchmarks in-process.
+Tasks are kept as compact records in the order of ids with an index of ids
+by status. Optionally, they are persisted to a directory: every change is
+appended to a log, which is compacted into a snapshot from time to time
+(written in a thread, off the event loop) and on shutdown. Jobs are kept
+in memory only; there is no archive and no sharding, and the data is not
+shared between processes.
+"""
+
+import asyncio
+import bisect
+import json
+import os
+import shutil
+import sys
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+)
+
+from src.schemas.schemas import JobOutSchema, TaskInSchema, TaskOutSchema
+
+from .base import JobData, JobStorage, StorageBackend, StorageSession, TaskStorage
+
+logger = getLogger("main_logger.storage")
+
+SNAPSHOT_FILE: str = "snapshot.ndjson"
+LOG_FILE: str = "log.ndjson"
+# The log being compacted into the snapshot in the background.
+OLD_LOG_FILE: str = "log.old.ndjson"
+
+# Entries of the snapshot and the log: ["put", id, title, description, status]
+# (a created or updated task), ["delete", id] and ["next_id", id] (the first
+# entry of the snapshot, so the ids of the deleted tasks are not given out again).
+PUT: str = "put"
+DELETE: str = "delete"
+NEXT_ID: str = "next_id"
+
+
+class TaskRecord(object):
+    """The task kept in memory (already validated)."""
+
+    __slots__ = ("id", "title", "description", "status")
+
+    def __init__(self, idx: int, title: str, description: str, status: str):
+        """Initialize class."""
+        self.id = idx
+        self.title = title
+        self.description = description
+        # There are a few statuses, so all records share the same strings.
+        self.status = sys.intern(status)
+
+    def to_schema(self) -> TaskOutSchema:
+        """Return the task as TaskOutSchema without validating it again."""
+        return TaskOutSchema.model_construct(
+            id=self.id,
+            title=self.title,
+            description=self.description,
+            status=self.status,
+        )
+
+    def to_row(self) -> Dict[str, Any]:
+        """Return the task as a row of the export."""
+        return {
+            "id": self.id,
+            "title": self.title,
+            "description": self.description,
+            "status": self.status,
+        }
+
+    def to_entry(self) -> List[Any]:
+        """Return the entry of the log that saves the task."""
+        return [PUT, self.id, self.title, self.description, self.status]
+
+
+class TaskLog(object):
+    """
+    Persists the tasks to the directory as a snapshot and the log of later changes.
+
+    Every entry is one JSON line written by one call and flushed to the OS,
+    so an entry torn by a crash can only be the last line of the log,
+    and it is skipped on loading.
+
+    To compact the log without stopping the writes, it is rotated to the old log
+    and the snapshot of the same moment is written while the new log is appended.
+    The old log is deleted once the snapshot is in place. Until then both
+    logs are loaded after the snapshot: replaying the changes which are already
+    in the snapshot leaves the tasks the same.
+
+    Args:
+        directory (str) - directory of the snapshot and the log.
+        snapshot_every (int) - number of entries in the log after which
+            it is compacted into a new snapshot.
+    """
+
+    def __init__(self, directory: str, snapshot_every: int):
+        """Initialize class."""
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.snapshot_path: str = os.path.join(directory, SNAPSHOT_FILE)
+        self.log_path: str = os.path.join(directory, LOG_FILE)
+        self.old_log_path: str = os.path.join(directory, OLD_LOG_FILE)
+        self._file: Optional[TextIO] = None
+        self._entries: int = 0
+
+    def reset(self) -> None:
+        """Delete the snapshot and the log."""
+        for path in (self.snapshot_path, self.old_log_path, self.log_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def load(self) -> Iterator[List[Any]]:
+        """Read the entries of the snapshot and then of the old and the new log."""
+        for path in (self.snapshot_path, self.old_log_path, self.log_path):
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    if not line.endswith("\n"):
+                        logger.warning("Skipped the torn last entry of %s.", path)
+                        break
+                    yield json.loads(line)
+
+    def append(self, entries: Iterable[List[Any]]) -> bool:
+        """Append the entries to the log and check that it is time to compact it."""
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = open(self.log_path, "a", encoding="utf-8")
+
+        lines: List[str] = [json.dumps(entry) + "\n" for entry in entries]
+        self._file.write("".join(lines))
+        self._file.flush()
+        self._entries += len(lines)
+        return self._entries >= self.snapshot_every
+
+    def rotate(self) -> None:
+        """Start a new log, moving the current one to the old log (or appending)."""
+        self.close()
+        if not os.path.exists(self.log_path):
+            pass
+        elif os.path.exists(self.old_log_path):
+            with open(self.log_path, "rb") as log, open(self.old_log_path, "ab") as old:
+                shutil.copyfileobj(log, old)
+            os.remove(self.log_path)
+        else:
+            os.replace(self.log_path, self.old_log_path)
+        self._entries = 0
+
+    def write_snapshot(self, entries: Iterable[List[Any]]) -> None:
+        """Replace the snapshot with the entries and delete the old log."""
+        os.makedirs(self.directory, exist_ok=True)
+        new_path: str = self.snapshot_path + ".new"
+        with open(new_path, "w", encoding="utf-8") as file:
+            file.writelines(json.dumps(entry) + "\n" for entry in entries)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(new_path, self.snapshot_path)
+
+        if os.path.exists(self.old_log_path):
+            os.remove(self.old_log_path)
+
+    def compact(self, entries: Iterable[List[Any]]) -> None:
+        """Replace the snapshot with the entries and start a new empty log."""
+        self.rotate()
+        self.write_snapshot(entries)
+
+    def close(self) -> None:
+        """Close the log."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _log_snapshot_error(task: asyncio.Task) -> None:
+    """Log the error of the snapshot written in the background."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Failed to write the snapshot: %s", task.exception())
+
+
+class MemoryTaskStorage(TaskStorage):
+    """
+    Keeps the tasks in memory.
+
+    The ids only grow, so the dict of the tasks is always ordered by id,
+    and the index keeps the sorted lists of ids of every status.
+
+    Args:
+        log (TaskLog | None) - persistence of the tasks (None - not persisted).
+    """
+
+    def __init__(self, log: Optional[TaskLog] = None):
+        """Initialize class."""
+        self.log = log
+        self._tasks: Dict[int, TaskRecord] = {}
+        self._ids_by_status: Dict[str, List[int]] = defaultdict(list)
+        self._next_id: int = 1
+        self._snapshot: Optional[asyncio.Task] = None
+
+    def open(self, reset: bool = False) -> None:
+        """Load the persisted tasks and compact the log into a new snapshot."""
+        if self.log is None:
+            return
+        if reset:
+            self.log.reset()
+
+        for entry in self.log.load():
+            if entry[0] == PUT:
+                self._put(TaskRecord(*entry[1:]))
+            elif entry[0] == DELETE:
+                self._remove(entry[1])
+            else:
+                self._next_id = max(self._next_id, entry[1])
+        self.log.compact(self._entries())
+        logger.info("Loaded %d tasks from %s.", len(self._tasks), self.log.directory)
+
+    async def close(self) -> None:
+        """Save the snapshot of the tasks (after the one being written, if any)."""
+        await self.wait_snapshot()
+        if self.log is not None:
+            self.log.compact(self._entries())
+
+    async def wait_snapshot(self) -> None:
+        """Wait until the snapshot being written in the background is finished."""
+        if self._snapshot is not None:
+            await asyncio.wait([self._snapshot])
+
+    def _entries(self) -> Iterator[List[Any]]:
+        """Return the entries of the snapshot of all tasks."""
+        yield [NEXT_ID, self._next_id]
+        for record in self._tasks.values():
+            yield record.to_entry()
+
+    def _save(self, entries: Iterable[List[Any]]) -> None:
+        """
+        Log the changes (and start the compaction of the log if it is time).
+
+        The snapshot is written from a copy of the entries in a thread,
+        so the requests are not stalled meanwhile. If the previous snapshot
+        is still being written, the compaction waits for the next change.
+        """
+        if self.log is None or not self.log.append(entries):
+            return
+        if self._snapshot is not None and not self._snapshot.done():
+            return
+
+        snapshot: List[List[Any]] = list(self._entries())
+        self.log.rotate()
+        self._snapshot = asyncio.create_task(
+            asyncio.to_thread(self.log.write_snapshot, snapshot)
+        )
+        self._snapshot.add_done_callback(_log_snapshot_error)
+
+    def _put(self, record: TaskRecord) -> None:
+        """Add the new task or replace the task with the same id."""
+        old: Optional[TaskRecord] = self._tasks.get(record.id)
+        if old is None or old.status != record.status:
+            if old is not None:
+                self._unindex(old)
+            bisect.insort(self._ids_by_status[record.status], record.id)
+        self._tasks[record.id] = record
+        self._next_id = max(self._next_id, record.id + 1)
+
+    def _remove(self, idx: int) -> Optional[TaskRecord]:
+        """Remove the task by id and return it (None if it is not found)."""
+        record: Optional[TaskRecord] = self._tasks.pop(idx, None)
+        if record is not None:
+            self._unindex(record)
+        return record
+
+    def _unindex(self, record: TaskRecord) -> None:
+        """Remove the id of the task from the index of its status."""
+        ids: List[int] = self._ids_by_status[record.status]
+        del ids[bisect.bisect_left(ids, record.id)]
+
+    def _new(self, data: TaskInSchema) -> TaskRecord:
+        """Add a new task with the next id."""
+        record = TaskRecord(self._next_id, data.title, data.description, data.status)
+        self._put(record)
+        return record
+
+    async def create(self, data: TaskInSchema, shard_key: Optional[str] = None) -> int:
+        """Create a new item (there are no shards, so the shard key is ignored)."""
+        record: TaskRecord = self._new(data)
+        self._save([record.to_entry()])
+        return record.id
+
+    async def create_many(
+        self, data: Sequence[TaskInSchema], shard_key: Optional[str] = None
+    ) -> List[int]:
+        """Create new items and return their ids (logged by one write)."""
+        records: List[TaskRecord] = [self._new(task) for task in data]
+        self._save(record.to_entry() for record in records)
+        return [record.id for record in records]
+
+    async def get_all(self, include_archived: bool = False) -> List[TaskOutSchema]:
+        """Get all items (nothing is archived in memory)."""
+        return [record.to_schema() for record in self._tasks.values()]
+
+    async def get(self, idx: int) -> Optional[TaskOutSchema]:
+        """Get the item by id. If item not found - return None."""
+        record: Optional[TaskRecord] = self._tasks.get(idx)
+        return None if record is None else record.to_schema()
+
+    async def get_many(
+        self, ids: Sequence[int]
+    ) -> Tuple[List[TaskOutSchema], List[int]]:
+        """Get the items by ids and the ids that were not found, in the order of ids."""
+        unique_ids: List[int] = list(dict.fromkeys(ids))
+        return (
+            [self._tasks[idx].to_schema() for idx in unique_ids if idx in self._tasks],
+            [idx for idx in unique_ids if idx not in self._tasks],
+        )
+
+    async def update(self, item_id: int, data: TaskInSchema) -> None:
+        """Update the item by id. If item not found - raise ValueError."""
+        old: Optional[TaskRecord] = self._tasks.get(item_id)
+        if old is None:
+            raise ValueError(self.not_found_error_str)
+
+        values: Dict[str, Any] = {
+            "title": old.title,
+            "description": old.description,
+            "status": old.status,
+        }
+        values.update(data.model_dump(exclude_unset=True))
+        record = TaskRecord(item_id, **values)
+        self._put(record)
+        self._save([record.to_entry()])
+
+    async def delete(self, item_id: int) -> None:
+        """Delete the item by id. If item not found - raise ValueError."""
+        if self._remove(item_id) is None:
+            raise ValueError(self.not_found_error_str)
+        self._save([[DELETE, item_id]])
+
+    async def get_all_by_status(
+        self, status: str, include_archived: bool = False
+    ) -> List[TaskOutSchema]:
+        """Get all tasks with status by the index."""
+        return [
+            self._tasks[idx].to_schema() for idx in self._ids_by_status.get(status, [])
+        ]
+
+    async def count(self, status: Optional[str] = None) -> int:
+        """Count the tasks (with the status, if any)."""
+        if status is None:
+            return len(self._tasks)
+        return len(self._ids_by_status.get(status, []))
+
+    async def iter_batches(
+        self, status: Optional[str], batch_size: int
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Iterate over the tasks (with the status, if any) in batches of rows.
+
+        The ids are taken at the start, the tasks deleted in the meantime are skipped.
+        """
+        ids: List[int] = list(
+            self._tasks if status is None else self._ids_by_status.get(status, [])
+        )
+        for start in range(0, len(ids), batch_size):
+            end: int = start + batch_size
+            rows: List[Dict[str, Any]] = [
+                self._tasks[idx].to_row()
+                for idx in ids[start:end]
+                if idx in self._tasks
+            ]
+            if rows:
+                yield rows
+
+
+class JobRecord(object):
+    """The import or export job kept in memory."""
+
+    __slots__ = (
+        "id",
+        "kind",
+        "status",
+        "media_type",
+        "task_status",
+        "path",
+        "processed",
+        "total",
+        "error",
+        "updated_at",
+    )
+
+    def __init__(
+        self,
+        idx: int,
+        kind: str,
+        media_type: str,
+        path: str,
+        task_status: Optional[str],
+    ):
+        """Initialize class."""
+        self.id = idx
+        self.kind = kind
+        self.status: str = "pending"
+        self.media_type = media_type
+        self.task_status = task_status
+        self.path = path
+        self.processed: int = 0
+        self.total: Optional[int] = None
+        self.error: Optional[str] = None
+        self.updated_at: datetime = datetime.now(timezone.utc)
+
+
+class MemoryJobStorage(JobStorage):
+    """Keeps the jobs in memory (they are not persisted)."""
+
+    def __init__(self) -> None:
+        """Initialize class."""
+        self._jobs: Dict[int, JobRecord] = {}
+
+    async def create(
+        self, kind: str, media_type: str, path: str, task_status: Optional[str] = None
+    ) -> int:
+        """Create a new pending job."""
+        idx: int = len(self._jobs) + 1
+        self._jobs[idx] = JobRecord(idx, kind, media_type, path, task_status)
+        return idx
+
+    async def get(self, idx: int) -> Optional[JobOutSchema]:
+        """Get the job by id. If job not found - return None."""
+        job: Optional[JobRecord] = self._jobs.get(idx)
+        return None if job is None else JobOutSchema.model_validate(job)
+
+    async def get_result(self, idx: int) -> Optional[Tuple[str, str]]:
+        """Get the path and the format of the file of the finished export job."""
+        job: Optional[JobRecord] = self._jobs.get(idx)
+        if job is None or job.kind != "export" or job.status != "done":
+            return None
+        return job.path, job.media_type
+
+    async def get_pending_ids(self) -> List[int]:
+        """Get ids of the jobs which have not been started yet."""
+        return [idx for idx, job in self._jobs.items() if job.status == "pending"]
+
+    async def start(self, idx: int) -> Optional[JobData]:
+        """Mark the pending job as running and return it (None if it is not pending)."""
+        job: Optional[JobRecord] = self._jobs.get(idx)
+        if job is None or job.status != "pending":
+            return None
+        job.status = "running"
+        job.updated_at = datetime.now(timezone.utc)
+        return job
+
+    async def progress(
+        self, idx: int, processed: int, total: Optional[int] = None
+    ) -> None:
+        """Save the progress of the job."""
+        job: JobRecord = self._jobs[idx]
+        job.processed = processed
+        if total is not None:
+            job.total = total
+        job.updated_at = datetime.now(timezone.utc)
+
+    async def finish(self, idx: int) -> None:
+        """Mark the job as done."""
+        self._jobs[idx].status = "done"
+
+    async def fail(self, idx: int, error: str) -> None:
+        """Mark the job as failed with the error."""
+        self._jobs[idx].status = "failed"
+        self._jobs[idx].error = error
+
+    async def fail_stale(
+        self, age: timedelta, error: str, exclude: Sequence[int] = ()
+    ) -> List[int]:
+        """Mark the running jobs which have not been updated for age as failed."""
+        deadline: datetime = datetime.now(timezone.utc) - age
+        ids: List[int] = [
+            idx
+            for idx, job in self._jobs.items()
+            if job.status == "running"
+            and job.updated_at <= deadline
+            and idx not in exclude
+        ]
+        for idx in ids:
+            await self.fail(idx, error)
+        return ids
+
+
+class MemoryStorageBackend(StorageBackend):
+    """
+    Keeps tasks and jobs in the memory of the process.
+
+    Args:
+        directory (str | None) - directory to persist the tasks to
+            (None - they are not persisted).
+        snapshot_every (int) - number of changes after which the log is compacted.
+    """
+
+    def __init__(self, directory: Optional[str] = None, snapshot_every: int = 10000):
+        """Initialize class."""
+        self.tasks = MemoryTaskStorage(
+            TaskLog(directory, snapshot_every) if directory else None
+        )
+        self.jobs = MemoryJobStorage()
+
+    async def open(self, reset: bool = False) -> None:
+        """Load the persisted tasks (deleting them first if reset)."""
+        self.tasks.open(reset)
+
+    async def close(self) -> None:
+        """Save the snapshot of the tasks."""
+        await self.tasks.close()
+
+    @asynccontextmanager
+    async def session(self) -> AsyncGenerator[StorageSession, None]:
+        """Return the storages (they are shared by all requests)."""
+        yield StorageSession(self.tasks, self.jobs)
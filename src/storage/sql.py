@@ -0,0 +1,88 @@
+"""The module responsible for the Postgres storage backend (the default one)."""
+
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from src.db.migrations import has_integer_ids, migrate
+from src.db.models import Base
+from src.db.repositories import JobRepository, TaskRepository
+from src.db.sharding import ShardedSession, align_sequences
+
+from .base import StorageBackend, StorageSession
+
+
+class SQLStorageSession(StorageSession):
+    """
+    The repositories over the sessions of all shards.
+
+    Args:
+        shards (ShardedSession) - sessions of the shards (jobs are in the first one).
+    """
+
+    def __init__(self, shards: ShardedSession):
+        """Initialize class."""
+        super().__init__(TaskRepository(shards), JobRepository(shards.for_shard(0)))
+        self.shards = shards
+
+    async def rollback(self) -> None:
+        """Roll back the transactions of the shards."""
+        await self.shards.rollback()
+
+
+class SQLStorageBackend(StorageBackend):
+    """
+    Keeps tasks and jobs in Postgres, tasks are spread over the shards.
+
+    Args:
+        session_makers (Sequence[async_sessionmaker]) - factories of the sessions
+            of the shards, the first one is the main database.
+        engines (Sequence[AsyncEngine]) - engines of the shards (created
+            and disposed by the backend; empty if they are managed elsewhere).
+    """
+
+    def __init__(
+        self,
+        session_makers: Sequence[async_sessionmaker[AsyncSession]],
+        engines: Sequence[AsyncEngine] = (),
+    ):
+        """Initialize class."""
+        self.session_makers = session_makers
+        self.engines = engines
+
+    async def open(self, reset: bool = False) -> None:
+        """
+        Create the tables in all shards (dropping them first if reset).
+
+        The tables created by the earlier versions of the app are migrated
+        (except for the heavy migrations, see src.db.migrations), and the sequences
+        of the shards are moved past the ids of all shards. Several shards
+        need the ids of BIGINT, so the app does not start with INTEGER ones.
+        """
+        for engine in self.engines:
+            async with engine.begin() as conn:
+                if reset:
+                    await conn.run_sync(Base.metadata.drop_all)
+
+                await conn.run_sync(Base.metadata.create_all)
+                await migrate(conn)
+                if len(self.engines) > 1 and await has_integer_ids(conn):
+                    raise RuntimeError(
+                        f"The task ids of {engine.url.database} are INTEGER, "
+                        "run python -m src.db.migrations before adding shards"
+                    )
+
+        if self.engines and len(self.session_makers) > 1:
+            await align_sequences(self.session_makers)
+
+    async def close(self) -> None:
+        """Close the connections of all shards."""
+        for engine in self.engines:
+            await engine.dispose()
+
+    @asynccontextmanager
+    async def session(self) -> AsyncGenerator[StorageSession, None]:
+        """Open the sessions of the shards (lazily) for a request or a job."""
+        async with ShardedSession(self.session_makers) as shards:
+            yield SQLStorageSession(shards)
@@ -1,43 +1,143 @@
 """The module responsible for the fixtures for the tests."""
 
+import os
 import random
+from contextlib import asynccontextmanager
 from string import ascii_letters
-from typing import AsyncGenerator, Callable, Generator, List
+from typing import AsyncGenerator, Generator, List
 
 import pytest
 import pytest_asyncio
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from httpx import ASGITransport, AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession
-
-from src.db.database import Session, engine
+from pytest_asyncio import is_async_test
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from src.config.app_config import Config
+from src.db import database
 from src.db.models import Base
 from src.db.repositories import TaskRepository
+from src.jobs.runner import JobRunner
 from src.main import create_app
 from src.schemas.schemas import STATUSES, TaskInSchema
+from src.storage.base import StorageBackend
+from src.storage.memory import MemoryStorageBackend
+from src.storage.sql import SQLStorageBackend
 
+# Every pytest-xdist worker gets its own schema, so the workers do not see
+# each other's data ("main" when the tests are run without xdist).
+SCHEMA: str = f"test_{os.getenv('PYTEST_XDIST_WORKER', 'main')}"
 
-@pytest_asyncio.fixture()
-async def db() -> AsyncGenerator[None, None]:
-    """Drop and raise the base before each test."""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
+
+def pytest_collection_modifyitems(items: List[pytest.Item]) -> None:
+    """Run all async tests in the event loop of the session-scoped fixtures."""
+    session_loop_marker = pytest.mark.asyncio(loop_scope="session")
+    for item in items:
+        if is_async_test(item):
+            item.add_marker(session_loop_marker, append=False)
+
+
+@asynccontextmanager
+async def _schema_engine(schema: str) -> AsyncGenerator[AsyncEngine, None]:
+    """Create the schema with all tables and the engine bound to it."""
+    engine_: AsyncEngine = create_async_engine(
+        database.db_config.url,
+        connect_args={"server_settings": {"search_path": schema}},
+    )
+    async with engine_.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {schema}"))
         await conn.run_sync(Base.metadata.create_all)
 
-    yield
+    yield engine_
+
+    async with engine_.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+    await engine_.dispose()
+
+
+@asynccontextmanager
+async def _rolled_back(engine_: AsyncEngine) -> AsyncGenerator[AsyncConnection, None]:
+    """Open a connection with a transaction which is rolled back at the end."""
+    async with engine_.connect() as conn:
+        transaction = await conn.begin()
+        # Sequences are not transactional, so the ids are reset explicitly.
+        for table in Base.metadata.sorted_tables:
+            if "id" in table.c:
+                await conn.execute(
+                    text(
+                        "SELECT setval(pg_get_serial_sequence(:table, 'id'), 1, false)"
+                    ),
+                    {"table": table.name},
+                )
+
+        yield conn
+
+        await transaction.rollback()
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def test_engine() -> AsyncGenerator[AsyncEngine, None]:
+    """Create the schema of the worker once per test session."""
+    async with _schema_engine(SCHEMA) as engine_:
+        yield engine_
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def second_shard_engine() -> AsyncGenerator[AsyncEngine, None]:
+    """Create the schema of the second shard of the worker once per test session."""
+    async with _schema_engine(f"{SCHEMA}_shard") as engine_:
+        yield engine_
+
 
-    await engine.dispose()
+@pytest_asyncio.fixture()
+async def db(test_engine: AsyncEngine) -> AsyncGenerator[AsyncConnection, None]:
+    """Wrap the test in a transaction which is rolled back after the test."""
+    async with _rolled_back(test_engine) as conn:
+        yield conn
+
+
+@pytest_asyncio.fixture()
+async def second_shard_db(
+    second_shard_engine: AsyncEngine,
+) -> AsyncGenerator[AsyncConnection, None]:
+    """Wrap the test in a transaction of the second shard too."""
+    async with _rolled_back(second_shard_engine) as conn:
+        yield conn
+
+
+@pytest.fixture
+def shard_sessions(
+    db: AsyncConnection, second_shard_db: AsyncConnection
+) -> Generator[List[async_sessionmaker[AsyncSession]], None, None]:
+    """Return the session factories of two shards bound to the test transactions."""
+    yield [
+        async_sessionmaker(
+            bind=conn, expire_on_commit=False, join_transaction_mode="create_savepoint"
+        )
+        for conn in (db, second_shard_db)
+    ]
 
 
 @pytest_asyncio.fixture()
-async def session(db) -> AsyncGenerator[AsyncSession, None]:
-    """Wrap queries in a transaction and return the session object."""
-    async with Session() as session_:
-        try:
-            yield session_
-        except Exception as exc:
-            await session_.rollback()
-            raise exc
+async def session(db: AsyncConnection) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Return the session object bound to the transaction of the test.
+
+    Commits in the code under test only release SAVEPOINTs,
+    the outer transaction is rolled back by the db fixture.
+    """
+    async with AsyncSession(
+        bind=db, expire_on_commit=False, join_transaction_mode="create_savepoint"
+    ) as session_:
+        yield session_
 
 
 @pytest.fixture
@@ -81,25 +181,58 @@ def many_task_in() -> Generator[List[TaskInSchema], None, None]:
     ]
 
 
-@pytest_asyncio.fixture(scope="function")
-async def dependency_session(session: AsyncSession) -> AsyncGenerator[Callable, None]:
-    """Start a test database session."""
+@pytest.fixture
+def storage_backend(
+    request: pytest.FixtureRequest,
+) -> Generator[StorageBackend, None, None]:
+    """
+    Return the storage backend of the test app.
+
+    With STORAGE_BACKEND=memory the app is tested without the database,
+    otherwise the sessions are bound to the transaction of the test.
+    """
+    if Config().storage.backend == "memory":
+        yield MemoryStorageBackend()
+        return
+
+    db: AsyncConnection = request.getfixturevalue("db")
+    yield SQLStorageBackend(
+        [
+            async_sessionmaker(
+                bind=db,
+                expire_on_commit=False,
+                join_transaction_mode="create_savepoint",
+            )
+        ]
+    )
 
-    async def overrides_get_session(request: Request):
-        request.state.session = session
-        yield
 
-    yield overrides_get_session
-    await session.close()
+@pytest.fixture
+def job_runner(
+    storage_backend: StorageBackend, tmp_path
+) -> Generator[JobRunner, None, None]:
+    """
+    Return the JobRunner without workers over the storage of the test.
+
+    The queued jobs are run by JobRunner.drain() in the test itself.
+    """
+    yield JobRunner(
+        storage_backend.session,
+        workers=0,
+        directory=str(tmp_path),
+        batch_size=10,
+    )
 
 
 @pytest.fixture(scope="function")
-def test_app(dependency_session: Callable) -> Generator[FastAPI, None, None]:
-    """Create a test_app with overridden dependencies."""
+def test_app(
+    storage_backend: StorageBackend, job_runner: JobRunner
+) -> Generator[FastAPI, None, None]:
+    """Create a test_app with the storage of the test."""
     _app: FastAPI = create_app()
-    _app.dependency_overrides[dependency_session] = dependency_session
+    _app.state.storage_backend = storage_backend
+    _app.state.job_runner = job_runner
     yield _app
-    _app.dependency_overrides.clear()
 
 
 @pytest_asyncio.fixture(scope="function")
@@ -0,0 +1 @@
+"""The package responsible for testing compression of the responses."""
@@ -0,0 +1,203 @@
+"""The module responsible for testing the compression middleware."""
+
+import asyncio
+import gzip
+import json
+from typing import Any, AsyncGenerator, Callable, Dict, Iterator, List, Optional
+
+import brotli
+import pytest
+import pytest_asyncio
+import zstandard
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from httpx import ASGITransport, AsyncClient
+
+from src.compression.codecs import BROTLI, ENCODINGS, GZIP, ZSTD, negotiate
+from src.compression.middleware import CompressionMiddleware
+from src.config.app_config import Compression
+from src.schemas.schemas import TaskInSchema
+
+BODY: bytes = b"The compressible body. " * 100
+CHUNKS: int = 5
+DECOMPRESS: Dict[str, Callable[[bytes], bytes]] = {
+    GZIP: gzip.decompress,
+    BROTLI: brotli.decompress,
+    ZSTD: lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+}
+
+
+@pytest.fixture
+def middleware() -> CompressionMiddleware:
+    """Return the middleware over the app with plain, streaming and encoded bodies."""
+    app = FastAPI()
+    data: Dict[str, bytes] = {"body": BODY}
+
+    @app.get("/items/")
+    async def items() -> Response:
+        return Response(content=data["body"], media_type="text/plain")
+
+    @app.put("/items/")
+    async def update_items() -> Response:
+        data["body"] = BODY.upper()
+        return Response(content=data["body"], media_type="text/plain")
+
+    @app.get("/stream/")
+    async def stream() -> StreamingResponse:
+        def chunks() -> Iterator[bytes]:
+            for _ in range(CHUNKS):
+                yield BODY
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    @app.get("/encoded/")
+    async def encoded() -> Response:
+        return Response(content=BODY, headers={"Content-Encoding": "custom"})
+
+    return CompressionMiddleware(
+        app, Compression(enabled=True, minimum_size=100, cache_size=2)
+    )
+
+
+@pytest_asyncio.fixture
+async def compressed_client(
+    middleware: CompressionMiddleware,
+) -> AsyncGenerator[AsyncClient, None]:
+    """Return the http client of the app wrapped in the middleware."""
+    async with AsyncClient(
+        transport=ASGITransport(app=middleware), base_url="http://localhost:8000"
+    ) as client:
+        yield client
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,expected",
+    [
+        (None, None),
+        ("", None),
+        ("identity", None),
+        ("gzip", GZIP),
+        ("gzip, deflate, br, zstd", ZSTD),
+        ("gzip;q=1.0, br;q=0.5", GZIP),
+        ("GZIP, BR", BROTLI),
+        ("*", ZSTD),
+        ("*, zstd;q=0", BROTLI),
+        ("zstd;q=0, br;q=0, gzip;q=0", None),
+        ("gzip;q=0.5, identity", None),
+        ("deflate", None),
+    ],
+)
+def test_negotiate(accept_encoding: Optional[str], expected: Optional[str]) -> None:
+    """Test the choice of the coding by the Accept-Encoding header."""
+    assert negotiate(accept_encoding) == expected
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("encoding", ENCODINGS)
+async def test_compressed_body(compressed_client: AsyncClient, encoding: str):
+    """Test that the body is compressed with the coding accepted by the client."""
+    response = await compressed_client.get(
+        "/items/", headers={"Accept-Encoding": encoding}
+    )
+    assert response.headers["content-encoding"] == encoding
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(BODY)
+    assert response.content == BODY
+
+
+@pytest.mark.asyncio
+async def test_uncompressed_body(
+    compressed_client: AsyncClient, middleware: CompressionMiddleware
+):
+    """Test that small, already encoded and not accepted bodies are sent as is."""
+    response = await compressed_client.get(
+        "/items/", headers={"Accept-Encoding": "identity"}
+    )
+    assert "content-encoding" not in response.headers
+    assert response.content == BODY
+
+    response = await compressed_client.get(
+        "/encoded/", headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "custom"
+
+    middleware.config.minimum_size = len(BODY) + 1
+    response = await compressed_client.get(
+        "/items/", headers={"Accept-Encoding": "gzip"}
+    )
+    assert "content-encoding" not in response.headers
+    assert response.content == BODY
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("encoding", ENCODINGS)
+async def test_compressed_stream(middleware: CompressionMiddleware, encoding: str):
+    """Test that the chunks of the streaming response are compressed one by one."""
+    messages: List[Dict[str, Any]] = []
+
+    async def receive() -> Dict[str, Any]:
+        # The client stays connected until the end of the response.
+        await asyncio.Event().wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        messages.append(message)
+
+    scope: Dict[str, Any] = {
+        "type": "http",
+        "method": "GET",
+        "path": "/stream/",
+        "query_string": b"",
+        "headers": [(b"accept-encoding", encoding.encode())],
+    }
+    await middleware(scope, receive, send)
+
+    headers: Dict[bytes, bytes] = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == encoding.encode()
+    assert b"content-length" not in headers
+    # Every chunk is sent as soon as it is compressed.
+    chunks: List[bytes] = [message["body"] for message in messages[1:]]
+    assert len(chunks) >= CHUNKS
+    assert all(message["more_body"] for message in messages[1:-1])
+    assert not messages[-1]["more_body"]
+    assert DECOMPRESS[encoding](b"".join(chunks)) == BODY * CHUNKS
+
+
+@pytest.mark.asyncio
+async def test_cache(compressed_client: AsyncClient, middleware: CompressionMiddleware):
+    """Test that the unchanged bodies are not compressed again."""
+    headers: Dict[str, str] = {"Accept-Encoding": GZIP}
+    for _ in range(3):
+        response = await compressed_client.get("/items/", headers=headers)
+        assert response.content == BODY
+    assert (middleware.cache.misses, middleware.cache.hits) == (1, 2)
+
+    # The body has been changed, so its cached form is outdated.
+    await compressed_client.put("/items/", headers=headers)
+    for _ in range(2):
+        response = await compressed_client.get("/items/", headers=headers)
+        assert response.content == BODY.upper()
+    assert (middleware.cache.misses, middleware.cache.hits) == (2, 3)
+
+    # Another query and another coding are cached separately,
+    # the least recently used body is evicted.
+    await compressed_client.get("/items/?status=todo", headers=headers)
+    await compressed_client.get("/items/", headers={"Accept-Encoding": BROTLI})
+    await compressed_client.get("/items/", headers=headers)
+    assert (middleware.cache.misses, middleware.cache.hits) == (5, 3)
+
+
+@pytest.mark.asyncio
+async def test_compressed_tasks(client: AsyncClient, task_in: TaskInSchema):
+    """Test that the long list of tasks is compressed."""
+    await client.post("/tasks/bulk/", json=[task_in.model_dump()] * 50)
+
+    response = await client.get("/tasks/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    tasks = response.json()
+    assert len(json.dumps(tasks)) > Compression().minimum_size
+
+    for encoding in ENCODINGS:
+        response = await client.get("/tasks/", headers={"Accept-Encoding": encoding})
+        assert response.headers["content-encoding"] == encoding
+        assert response.json() == tasks
@@ -0,0 +1,77 @@
+"""The module responsible for testing the archiving of done tasks."""
+
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.archive import TaskArchiver, partition_bounds
+from src.db.database import Session
+from src.db.models import Task
+from src.db.repositories import TaskRepository
+from src.schemas.schemas import TaskInSchema, TaskOutSchema
+
+
+async def _create_old_done_task(
+    session: AsyncSession, rep: TaskRepository, task_in: TaskInSchema
+) -> int:
+    """Create a done task which was updated long ago and return its id."""
+    task_id: int = await rep.create(task_in.model_copy(update={"status": "done"}))
+    await session.execute(
+        update(Task)
+        .where(Task.id == task_id)
+        .values(updated_at=datetime.now(timezone.utc) - timedelta(days=365))
+    )
+    await session.commit()
+    return task_id
+
+
+def test_partition_bounds() -> None:
+    """Test that the partition bounds cover the month of the moment."""
+    start, end = partition_bounds(datetime(2024, 12, 15, 10, 30, tzinfo=timezone.utc))
+    assert start == datetime(2024, 12, 1, tzinfo=timezone.utc)
+    assert end == datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_archive_batch(
+    session: AsyncSession, rep: TaskRepository, task_in: TaskInSchema
+) -> None:
+    """Test that only old done tasks are moved and are still found by id."""
+    old_task_id: int = await _create_old_done_task(session, rep, task_in)
+    fresh_task_id: int = await rep.create(task_in.model_copy(update={"status": "done"}))
+
+    archiver = TaskArchiver(Session, age=timedelta(days=30), batch_size=100)
+    assert await archiver.archive_batch(session) == 1
+    assert await archiver.archive_batch(session) == 0
+
+    archived_task = await rep.get(old_task_id)
+    assert isinstance(archived_task, TaskOutSchema)
+    assert archived_task.id == old_task_id
+
+    hot_tasks: List[TaskOutSchema] = await rep.get_all()
+    assert [task.id for task in hot_tasks] == [fresh_task_id]
+
+    all_tasks: List[TaskOutSchema] = await rep.get_all_by_status(
+        "done", include_archived=True
+    )
+    assert sorted(task.id for task in all_tasks) == [old_task_id, fresh_task_id]
+
+
+@pytest.mark.asyncio
+async def test_archived_task_is_not_updated(
+    session: AsyncSession,
+    rep: TaskRepository,
+    task_in: TaskInSchema,
+    updated_task_in: TaskInSchema,
+) -> None:
+    """Test that archived tasks are read-only."""
+    task_id: int = await _create_old_done_task(session, rep, task_in)
+    await TaskArchiver(Session, timedelta(days=30), 100).archive_batch(session)
+
+    with pytest.raises(ValueError):
+        await rep.update(task_id, updated_task_in)
+    with pytest.raises(ValueError):
+        await rep.delete(task_id)
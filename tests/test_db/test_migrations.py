@@ -0,0 +1,92 @@
+"""The module responsible for testing the migrations of existing databases."""
+
+from typing import AsyncGenerator, List
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from src.db import database
+from src.db.migrations import has_integer_ids, migrate, migrate_heavy
+from src.db.models import Base, Task
+from tests.conftest import SCHEMA
+
+OLD_SCHEMA: str = f"{SCHEMA}_old"
+
+
+@pytest_asyncio.fixture
+async def old_engine() -> AsyncGenerator[AsyncEngine, None]:
+    """Create the schema with the task table of the first version of the app."""
+    engine_: AsyncEngine = create_async_engine(
+        database.db_config.url,
+        connect_args={"server_settings": {"search_path": OLD_SCHEMA}},
+    )
+    async with engine_.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {OLD_SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {OLD_SCHEMA}"))
+        await conn.execute(
+            text(
+                "CREATE TABLE task (id SERIAL PRIMARY KEY, title VARCHAR NOT NULL, "
+                "description TEXT NOT NULL, status VARCHAR(15) NOT NULL)"
+            )
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO task (title, description, status) "
+                "VALUES ('Old', 'Old task', 'todo')"
+            )
+        )
+
+    yield engine_
+
+    async with engine_.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA {OLD_SCHEMA} CASCADE"))
+    await engine_.dispose()
+
+
+@pytest.mark.asyncio
+async def test_migrate(old_engine: AsyncEngine) -> None:
+    """Test that the task table of the first version is brought up to date."""
+    for _ in range(2):
+        async with old_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await migrate(conn)
+
+    async with AsyncSession(old_engine) as session:
+        task_q = await session.execute(select(Task))
+        task: Task = task_q.scalar_one()
+        assert (task.id, task.title) == (1, "Old")
+        assert task.updated_at is not None
+        # The heavy migrations are not run on startup.
+        assert await _indexes(session) == []
+    async with old_engine.connect() as conn:
+        assert await has_integer_ids(conn)
+
+    for _ in range(2):
+        await migrate_heavy(old_engine)
+
+    async with AsyncSession(old_engine) as session:
+        assert await _indexes(session) == ["ix_task_status_updated_at"]
+
+        # The ids of the shards do not fit into INTEGER.
+        session.add(Task(id=2**40, title="New", description="New", status="todo"))
+        await session.commit()
+        id_q = await session.execute(select(func.nextval("task_id_seq")))
+        assert id_q.scalar_one() == 2
+    async with old_engine.connect() as conn:
+        assert not await has_integer_ids(conn)
+
+
+async def _indexes(session: AsyncSession) -> List[str]:
+    """Return the valid indexes of the task table of the old schema (but the key)."""
+    indexes_q = await session.execute(
+        text(
+            "SELECT indexname FROM pg_indexes JOIN pg_index "
+            "ON indexrelid = to_regclass(schemaname || '.' || indexname) "
+            "WHERE schemaname = :schema AND tablename = 'task' "
+            "AND indisvalid AND NOT indisprimary"
+        ),
+        {"schema": OLD_SCHEMA},
+    )
+    return list(indexes_q.scalars().all())
@@ -41,13 +41,30 @@ async def test_task_repository_get_all(
     tasks_from_db: List[TaskOutSchema] = await rep.get_all()
 
     for task_from_db, task_ in zip(
-        sorted(tasks_from_db, key=lambda data: data.title),
-        sorted(many_task_in, key=lambda data: data.title),
+        sorted(tasks_from_db, key=lambda data: (data.title, data.description)),
+        sorted(many_task_in, key=lambda data: (data.title, data.description)),
     ):
         for key, value in task_:
             assert value == getattr(task_from_db, key)
 
 
+@pytest.mark.asyncio
+async def test_task_repository_get_many(
+    rep: TaskRepository, many_task_in: List[TaskInSchema]
+) -> None:
+    """Test the TaskRepository method get_many."""
+    task_ids: List[int] = [await rep.create(task) for task in many_task_in]
+    not_existing_ids: List[int] = [max(task_ids) + 1, max(task_ids) + 2]
+    requested_ids: List[int] = task_ids[::-1] + not_existing_ids
+
+    tasks, missing = await rep.get_many(requested_ids)
+    assert [task.id for task in tasks] == task_ids[::-1]
+    assert missing == not_existing_ids
+
+    tasks, missing = await rep.get_many([])
+    assert tasks == [] and missing == []
+
+
 @pytest.mark.asyncio
 async def test_task_repository_update(
     rep: TaskRepository, task_in: TaskInSchema, updated_task_in: TaskInSchema
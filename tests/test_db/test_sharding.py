@@ -0,0 +1,173 @@
+"""The module responsible for testing the spreading of tasks over the shards."""
+
+from datetime import datetime, timezone
+from typing import Any, List
+
+import pytest
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.db.models import ArchivedTask, Task
+from src.db.rebalance import ShardRebalancer
+from src.db.repositories import TaskRepository
+from src.db.sharding import (
+    BUCKETS,
+    ShardedSession,
+    align_sequences,
+    bucket_for_key,
+    bucket_of,
+    local_id_of,
+    make_id,
+    merge_by_id,
+    shard_of_bucket,
+)
+from src.schemas.schemas import TaskInSchema, TaskOutSchema
+
+
+def _key_of_shard(shard: int, shards: int) -> str:
+    """Return a shard key whose tasks are stored in the shard."""
+    return next(
+        key
+        for key in map(str, range(BUCKETS))
+        if shard_of_bucket(bucket_for_key(key), shards) == shard
+    )
+
+
+async def _count(session_maker: async_sessionmaker[AsyncSession], model: Any) -> int:
+    """Return the number of rows of the model in the shard."""
+    async with session_maker() as session:
+        count_q = await session.execute(select(func.count()).select_from(model))
+        return count_q.scalar_one()
+
+
+def test_ids() -> None:
+    """Test that the bucket and the local id are encoded in the id."""
+    idx: int = make_id(BUCKETS - 1, 12345)
+    assert bucket_of(idx) == BUCKETS - 1
+    assert local_id_of(idx) == 12345
+    assert idx < 2**53
+    # The ids are ordered by the local ids first.
+    assert make_id(BUCKETS - 1, 1) < make_id(0, 2)
+
+
+def test_shard_of_bucket() -> None:
+    """Test that buckets are spread evenly and only move to a new shard."""
+    for shards in range(1, 9):
+        assert shard_of_bucket(0, shards) == 0
+
+        counts: List[int] = [0] * shards
+        for bucket in range(BUCKETS):
+            shard: int = shard_of_bucket(bucket, shards)
+            counts[shard] += 1
+            if shards > 1:
+                assert shard in (shard_of_bucket(bucket, shards - 1), shards - 1)
+        assert max(counts) - min(counts) < BUCKETS / shards / 2
+
+
+@pytest.mark.asyncio
+async def test_sharded_repository(
+    shard_sessions: List[async_sessionmaker[AsyncSession]],
+    task_in: TaskInSchema,
+    many_task_in: List[TaskInSchema],
+) -> None:
+    """Test that the tasks are routed to the shards and merged from them."""
+    async with ShardedSession(shard_sessions) as shards:
+        rep = TaskRepository(shards)
+        first_id: int = await rep.create(task_in, _key_of_shard(0, 2))
+        second_id: int = await rep.create(task_in, _key_of_shard(1, 2))
+        assert shard_of_bucket(bucket_of(first_id), 2) == 0
+        assert shard_of_bucket(bucket_of(second_id), 2) == 1
+        task_ids: List[int] = await rep.create_many(many_task_in)
+
+        all_tasks: List[TaskOutSchema] = await rep.get_all()
+        assert [task.id for task in all_tasks] == sorted(
+            [first_id, second_id] + task_ids
+        )
+        tasks, missing = await rep.get_many([second_id, first_id, make_id(5, 999)])
+        assert [task.id for task in tasks] == [second_id, first_id]
+        assert missing == [make_id(5, 999)]
+
+        await rep.delete(second_id)
+        assert await rep.get(second_id) is None
+
+    assert await _count(shard_sessions[0], Task) > 0
+    assert await _count(shard_sessions[1], Task) > 0
+
+
+@pytest.mark.asyncio
+async def test_merge_by_id(
+    shard_sessions: List[async_sessionmaker[AsyncSession]],
+    many_task_in: List[TaskInSchema],
+) -> None:
+    """Test that the rows streamed from the shards are merged in batches by id."""
+    async with ShardedSession(shard_sessions) as shards:
+        task_ids: List[int] = await TaskRepository(shards).create_many(many_task_in * 3)
+        query = select(Task.id).order_by(Task.id).execution_options(yield_per=2)
+        results = [await session.stream(query) for session in shards.all()]
+        batches: List[List[Any]] = [rows async for rows in merge_by_id(results, 2)]
+
+    assert all(len(rows) == 2 for rows in batches[:-1])
+    assert [row.id for rows in batches for row in rows] == sorted(task_ids)
+
+
+@pytest.mark.asyncio
+async def test_rebalance(
+    shard_sessions: List[async_sessionmaker[AsyncSession]],
+    many_task_in: List[TaskInSchema],
+) -> None:
+    """Test that adding a shard moves only the tasks of its buckets there."""
+    async with ShardedSession(shard_sessions[:1]) as shards:
+        task_ids: List[int] = await TaskRepository(shards).create_many(many_task_in)
+        archived_id: int = make_id(bucket_for_key(_key_of_shard(1, 2)), 10**6)
+        await shards.for_shard(0).execute(
+            insert(ArchivedTask).values(
+                id=archived_id,
+                title="Archived",
+                description="Archived",
+                status="done",
+                updated_at=datetime.now(timezone.utc),
+            )
+        )
+        await shards.for_shard(0).commit()
+
+    rebalancer = ShardRebalancer(shard_sessions, batch_size=7)
+    # The batches are read after the last moved id.
+    assert await rebalancer.move_batch(0, Task, max(task_ids)) == []
+    moved: int = await rebalancer.run()
+    moved_ids: List[int] = [
+        idx for idx in task_ids if shard_of_bucket(bucket_of(idx), 2) == 1
+    ]
+    assert moved == len(moved_ids) + 1
+    assert await ShardRebalancer(shard_sessions, batch_size=7).run() == 0
+    assert await _count(shard_sessions[1], Task) == len(moved_ids)
+
+    async with ShardedSession(shard_sessions) as shards:
+        rep = TaskRepository(shards)
+        all_tasks: List[TaskOutSchema] = await rep.get_all(include_archived=True)
+        assert [task.id for task in all_tasks] == sorted(task_ids + [archived_id])
+
+        # The sequence of the new shard does not give out the moved local ids.
+        new_id: int = await rep.create(many_task_in[0], _key_of_shard(1, 2))
+        assert local_id_of(new_id) > 10**6
+
+
+@pytest.mark.asyncio
+async def test_align_sequences(
+    shard_sessions: List[async_sessionmaker[AsyncSession]],
+    task_in: TaskInSchema,
+) -> None:
+    """Test that the shards do not give out the local ids of the other shards."""
+    # The plain id of a task of a single database, its bucket is on the second shard.
+    old_id: int = make_id(bucket_for_key(_key_of_shard(1, 2)), 100)
+    async with ShardedSession(shard_sessions[:1]) as shards:
+        await shards.for_shard(0).execute(
+            insert(Task).values(id=old_id, **task_in.model_dump())
+        )
+        await shards.for_shard(0).commit()
+
+    await align_sequences(shard_sessions)
+
+    async with ShardedSession(shard_sessions) as shards:
+        new_id: int = await TaskRepository(shards).create(task_in, _key_of_shard(1, 2))
+    assert bucket_of(new_id) == bucket_of(old_id)
+    assert local_id_of(new_id) > local_id_of(old_id)
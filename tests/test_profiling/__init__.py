@@ -0,0 +1 @@
+"""The package responsible for testing profiling of the requests."""
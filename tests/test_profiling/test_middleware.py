@@ -0,0 +1,136 @@
+"""The module responsible for testing the profiling middleware."""
+
+import os
+import pstats
+from typing import AsyncGenerator, Callable
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from src.config.app_config import Profiling
+from src.profiling.metrics import SQLBudgetError, SQLBudgetWarning, sql_budget
+from src.profiling.middleware import ProfilingMiddleware
+from src.schemas.schemas import TaskInSchema
+
+TOKEN: str = "secret"
+
+
+@pytest_asyncio.fixture
+async def make_client(
+    test_app: FastAPI,
+) -> AsyncGenerator[Callable[[Profiling], AsyncClient], None]:
+    """Return the factory of the http clients of the app wrapped in the middleware."""
+    clients = []
+
+    def _make_client(config: Profiling) -> AsyncClient:
+        client = AsyncClient(
+            transport=ASGITransport(app=ProfilingMiddleware(test_app, config)),
+            base_url="http://localhost:8000",
+        )
+        clients.append(client)
+        return client
+
+    yield _make_client
+
+    for client in clients:
+        await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_profiled_request(
+    make_client: Callable[[Profiling], AsyncClient], task_in: TaskInSchema, tmp_path
+):
+    """Test that the request with the token is profiled."""
+    client: AsyncClient = make_client(
+        Profiling(enabled=True, token=TOKEN, directory=str(tmp_path))
+    )
+    response = await client.post("/tasks/", json=task_in.model_dump())
+    assert response.status_code == 201
+    assert "server-timing" not in response.headers
+    await client.post("/tasks/bulk/", json=[task_in.model_dump()] * 100)
+
+    response = await client.get("/tasks/", headers={"X-Profile": "wrong"})
+    assert "server-timing" not in response.headers
+    assert os.listdir(tmp_path) == []
+
+    response = await client.get("/tasks/", headers={"X-Profile": TOKEN})
+    assert response.status_code == 200
+    timing: str = response.headers["server-timing"]
+    for name in ("db", "validation", "serialization", "logging", "total"):
+        assert f"{name};" in timing
+    assert 'db;desc="1 statements"' in timing
+    # The JSON response is encoded by the route, not by FastAPI.
+    assert "serialization;dur=0.00" not in timing
+
+    profiles = os.listdir(tmp_path)
+    assert len(profiles) == 1
+    assert pstats.Stats(str(tmp_path / profiles[0])).total_calls > 0
+
+
+@pytest.mark.asyncio
+async def test_disabled_profiling(
+    make_client: Callable[[Profiling], AsyncClient], tmp_path
+):
+    """Test that the token is ignored if profiling is disabled."""
+    client: AsyncClient = make_client(
+        Profiling(enabled=False, token=TOKEN, directory=str(tmp_path))
+    )
+    response = await client.get("/tasks/", headers={"X-Profile": TOKEN})
+    assert "server-timing" not in response.headers
+    assert not os.path.exists(tmp_path / "profiles")
+
+
+@pytest.mark.asyncio
+async def test_sql_budget(
+    make_client: Callable[[Profiling], AsyncClient],
+    task_in: TaskInSchema,
+    updated_task_in: TaskInSchema,
+    caplog,
+):
+    """Test that the requests exceeding the budget of SQL statements are reported."""
+    client: AsyncClient = make_client(Profiling(sql_budget=1, sql_budget_mode="warn"))
+    response = await client.post("/tasks/", json=task_in.model_dump())
+    task_id: int = response.json()["task_id"]
+
+    with caplog.at_level("WARNING", logger="main_logger.profiling"):
+        response = await client.put(
+            f"/tasks/{task_id}/", json=updated_task_in.model_dump()
+        )
+    assert response.status_code == 200
+    assert "the budget is 1" in caplog.text
+
+    client = make_client(Profiling(sql_budget=1, sql_budget_mode="fail"))
+    with pytest.raises(SQLBudgetError):
+        await client.put(f"/tasks/{task_id}/", json=task_in.model_dump())
+
+
+def test_sql_budget_fail_mode(monkeypatch) -> None:
+    """Test that the budget cannot fail the requests outside of DEBUG mode."""
+    monkeypatch.setenv("DEBUG", "0")
+    with pytest.raises(ValueError):
+        Profiling(sql_budget=1, sql_budget_mode="fail")
+    assert Profiling(sql_budget=1, sql_budget_mode="warn").sql_budget == 1
+
+    monkeypatch.setenv("DEBUG", "1")
+    with pytest.raises(ValueError):
+        Profiling(sql_budget_mode="raise")
+
+
+@pytest.mark.asyncio
+async def test_sql_budget_block(client: AsyncClient, task_in: TaskInSchema):
+    """Test the sql_budget context manager for tests."""
+    with sql_budget(1) as metrics:
+        await client.post("/tasks/", json=task_in.model_dump())
+    assert metrics.statements == 1
+
+    with pytest.warns(SQLBudgetWarning):
+        with sql_budget(1, mode="warn"):
+            await client.get("/tasks/")
+            await client.get("/tasks/")
+
+    with pytest.raises(SQLBudgetError):
+        with sql_budget(1):
+            await client.get("/tasks/")
+            await client.get("/tasks/")
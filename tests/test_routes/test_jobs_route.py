@@ -0,0 +1,206 @@
+"""The module responsible for testing endpoints from the module jobs_route.py."""
+
+import asyncio
+import csv
+import io
+import json
+from typing import AsyncIterator, List
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from src.jobs.runner import INTERRUPTED_ERROR, JobRunner
+from src.routes import jobs_route
+from src.schemas import formats
+from src.schemas.schemas import MAX_JOB_ID, TaskInSchema
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("media_type", formats.FILE_MEDIA_TYPES)
+async def test_import_tasks(
+    client: AsyncClient,
+    job_runner: JobRunner,
+    many_task_in: List[TaskInSchema],
+    media_type: str,
+    monkeypatch,
+):
+    """Test the endpoint POST /tasks/import/ and the progress of the job."""
+    buffer = io.StringIO()
+    formats.write_rows(
+        buffer, [task.model_dump() for task in many_task_in], media_type, True
+    )
+
+    async def upload() -> AsyncIterator[bytes]:
+        for line in buffer.getvalue().splitlines(keepends=True):
+            yield line.encode()
+
+    # The file is written by several pieces.
+    monkeypatch.setattr(jobs_route, "UPLOAD_BUFFER_SIZE", 256)
+    response = await client.post(
+        "/tasks/import/", content=upload(), headers={"Content-Type": media_type}
+    )
+    assert response.status_code == 202
+    job_id: int = response.json()["job_id"]
+
+    response = await client.get(f"/jobs/{job_id}/")
+    assert response.status_code == 200
+    assert response.json()["status"] == "pending"
+
+    await job_runner.drain()
+
+    response = await client.get(f"/jobs/{job_id}/")
+    assert response.status_code == 200
+    assert response.json()["status"] == "done"
+    assert response.json()["processed"] == len(many_task_in)
+
+    response = await client.get("/tasks/")
+    assert sorted(task["title"] for task in response.json()) == sorted(
+        task.title for task in many_task_in
+    )
+
+
+@pytest.mark.asyncio
+async def test_import_invalid_tasks(client: AsyncClient, job_runner: JobRunner):
+    """Test that the import job with an invalid task fails with the error."""
+    response = await client.post(
+        "/tasks/import/", content=b"<tasks/>", headers={"Content-Type": "text/xml"}
+    )
+    assert response.status_code == 415
+
+    lines: List[str] = [
+        json.dumps({"title": "Title", "description": "Description", "status": "todo"}),
+        json.dumps({"title": "Title", "description": "Description", "status": "bad"}),
+    ]
+    response = await client.post(
+        "/tasks/import/",
+        content="\n".join(lines).encode(),
+        headers={"Content-Type": formats.NDJSON},
+    )
+    job_id: int = response.json()["job_id"]
+    await job_runner.drain()
+
+    response = await client.get(f"/jobs/{job_id}/")
+    assert response.json()["status"] == "failed"
+    assert "#2" in response.json()["error"]
+
+
+@pytest.mark.asyncio
+async def test_export_tasks(
+    client: AsyncClient, job_runner: JobRunner, many_task_in: List[TaskInSchema]
+):
+    """Test the endpoints POST /tasks/export/ and GET /jobs/{idx}/result/."""
+    response = await client.post(
+        "/tasks/bulk/", json=[task.model_dump() for task in many_task_in]
+    )
+    assert response.status_code == 201
+
+    response = await client.post("/tasks/export/?status=todo")
+    assert response.status_code == 202
+    job_id: int = response.json()["job_id"]
+
+    response = await client.get(f"/jobs/{job_id}/result/")
+    assert response.status_code == 404
+
+    await job_runner.drain()
+
+    expected_titles: List[str] = sorted(
+        task.title for task in many_task_in if task.status == "todo"
+    )
+    response = await client.get(f"/jobs/{job_id}/")
+    assert response.json()["status"] == "done"
+    assert response.json()["processed"] == response.json()["total"]
+    assert response.json()["total"] == len(expected_titles)
+
+    response = await client.get(response.json()["result"])
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert sorted(row["title"] for row in rows) == expected_titles
+
+
+@pytest.mark.asyncio
+async def test_export_invalid_params(client: AsyncClient):
+    """Test the endpoint POST /tasks/export/ with invalid status and format."""
+    response = await client.post("/tasks/export/?status=invalid")
+    assert response.status_code == 400
+
+    response = await client.post("/tasks/export/?media_type=application/xml")
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_not_existing_job(client: AsyncClient):
+    """Test the endpoint GET /jobs/{idx}/ with not existing idx."""
+    response = await client.get("/jobs/1000/")
+    assert response.status_code == 404
+    for path in (f"/jobs/{MAX_JOB_ID + 1}/", f"/jobs/{MAX_JOB_ID + 1}/result/"):
+        response = await client.get(path)
+        assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_interrupted_jobs(
+    client: AsyncClient, job_runner: JobRunner, test_app: FastAPI
+):
+    """Test that the jobs left running by a stopped app are marked as failed."""
+    job_ids: List[int] = []
+    for _ in range(2):
+        response = await client.post("/tasks/export/")
+        job_ids.append(response.json()["job_id"])
+
+    # Both jobs were started by a worker which has been stopped since.
+    async with test_app.state.storage_backend.session() as storage:
+        for job_id in job_ids:
+            await storage.jobs.start(job_id)
+
+    assert await job_runner.fail_stale() == []
+    job_runner.stale_after = 0
+    # The first job is run by this runner, so it is not stale.
+    job_runner._running.add(job_ids[0])
+    assert await job_runner.fail_stale() == [job_ids[1]]
+
+    response = await client.get(f"/jobs/{job_ids[0]}/")
+    assert response.json()["status"] == "running"
+    response = await client.get(f"/jobs/{job_ids[1]}/")
+    assert response.json()["status"] == "failed"
+    assert response.json()["error"] == INTERRUPTED_ERROR
+
+
+@pytest.mark.asyncio
+async def test_worker_survives_errors(
+    client: AsyncClient, job_runner: JobRunner, test_app: FastAPI, monkeypatch
+):
+    """Test that an error of the storage does not stop the worker."""
+    async with test_app.state.storage_backend.session() as storage:
+        job_ids: List[int] = [
+            await storage.jobs.create(
+                "export", formats.NDJSON, job_runner.new_path("export", formats.NDJSON)
+            )
+            for _ in range(2)
+        ]
+        jobs_class = type(storage.jobs)
+
+    start = jobs_class.start
+    calls: List[int] = []
+
+    async def failing_start(self, idx: int):
+        calls.append(idx)
+        if len(calls) == 1:
+            raise ConnectionError("The database is unreachable")
+        return await start(self, idx)
+
+    monkeypatch.setattr(jobs_class, "start", failing_start)
+    # One worker without the check of stale jobs, which would share the connection.
+    worker = asyncio.create_task(job_runner._work())
+    for job_id in job_ids:
+        job_runner.submit(job_id)
+    await asyncio.wait_for(job_runner.queue.join(), timeout=5)
+    assert not worker.done()
+    worker.cancel()
+    await asyncio.gather(worker, return_exceptions=True)
+
+    assert calls == job_ids
+    response = await client.get(f"/jobs/{job_ids[0]}/")
+    assert response.json()["status"] == "pending"
+    response = await client.get(f"/jobs/{job_ids[1]}/")
+    assert response.json()["status"] == "done"
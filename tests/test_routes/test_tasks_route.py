@@ -2,10 +2,20 @@
 
 from typing import Any, Dict, List
 
+import msgpack
 import pytest
 from httpx import AsyncClient
 
-from src.schemas.schemas import STATUSES, TaskInSchema
+from src.profiling.metrics import sql_budget
+from src.schemas import formats
+from src.schemas.schemas import (
+    MAX_BATCH_TASK_IDS,
+    MAX_QUERY_TASK_IDS,
+    MAX_TASK_ID,
+    STATUSES,
+    TaskInSchema,
+    TaskOutSchema,
+)
 
 
 @pytest.mark.asyncio
@@ -15,6 +25,44 @@ async def test_post_tasks(client: AsyncClient, task_in: TaskInSchema) -> None:
     assert response.status_code == 201
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("media_type", formats.MEDIA_TYPES)
+async def test_post_tasks_bulk(
+    client: AsyncClient, many_task_in: List[TaskInSchema], media_type: str
+) -> None:
+    """Test the endpoint POST /tasks/bulk/ with all supported formats."""
+    response = await client.post("/tasks/", json=many_task_in[0].model_dump())
+    assert response.status_code == 201
+    response = await client.get(f"/tasks/{response.json()['task_id']}/")
+    assert response.status_code == 200
+    body: bytes = formats.encode_tasks(
+        [TaskOutSchema(**response.json())] * 3, media_type
+    )
+
+    response = await client.post(
+        "/tasks/bulk/", content=body, headers={"Content-Type": media_type}
+    )
+    assert response.status_code == 201
+    assert response.json()["task_ids"] == [2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_post_tasks_bulk_invalid_data(client: AsyncClient) -> None:
+    """Test the endpoint POST /tasks/bulk/ with invalid input data."""
+    response = await client.post(
+        "/tasks/bulk/", content=b"<tasks/>", headers={"Content-Type": "text/xml"}
+    )
+    assert response.status_code == 415
+
+    response = await client.post("/tasks/bulk/", json=[{"invalid": "data"}])
+    assert response.status_code == 422
+
+    response = await client.post(
+        "/tasks/bulk/", content=b"[{", headers={"Content-Type": formats.JSON}
+    )
+    assert response.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_post_tasks_invalid_data(
     client: AsyncClient, task_in: TaskInSchema
@@ -76,6 +124,40 @@ async def test_get_all_tasks_with_status(
                     assert value == getattr(task_from_test, key)
 
 
+@pytest.mark.asyncio
+async def test_get_all_tasks_in_other_formats(
+    client: AsyncClient, many_task_in: List[TaskInSchema]
+):
+    """Test the endpoint GET /tasks/ with formats chosen by the Accept header."""
+    response = await client.post(
+        "/tasks/bulk/", json=[task_in.model_dump() for task_in in many_task_in]
+    )
+    assert response.status_code == 201
+    task_ids: List[int] = response.json()["task_ids"]
+
+    response = await client.get("/tasks/", headers={"Accept": formats.MSGPACK})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == formats.MSGPACK
+    assert sorted(task["id"] for task in msgpack.unpackb(response.content)) == task_ids
+    # Shared caches keep the formats of the same URL apart.
+    assert "Accept" in response.headers["vary"]
+    response = await client.get(
+        f"/tasks/{task_ids[0]}/", headers={"Accept": formats.MSGPACK}
+    )
+    assert "Accept" in response.headers["vary"]
+
+    response = await client.get("/tasks/", headers={"Accept": formats.COLUMNS_JSON})
+    assert response.status_code == 200
+    assert sorted(response.json()["id"]) == task_ids
+
+    response = await client.get("/tasks/", headers={"Accept": formats.CSV})
+    assert response.status_code == 200
+    assert response.text.splitlines()[0] == "id,title,description,status"
+
+    response = await client.get("/tasks/", headers={"Accept": "image/png"})
+    assert response.status_code == 406
+
+
 @pytest.mark.asyncio
 async def test_get_all_tasks_with_invalid_status(
     client: AsyncClient, many_task_in: List[TaskInSchema]
@@ -90,12 +172,72 @@ async def test_get_all_tasks_with_invalid_status(
     assert response.status_code == 400
 
 
+@pytest.mark.asyncio
+async def test_get_tasks_by_ids(client: AsyncClient, many_task_in: List[TaskInSchema]):
+    """Test the endpoints GET /tasks/?ids=... and POST /tasks/batch-get/."""
+    task_ids: List[int] = []
+    for task_in in many_task_in:
+        response = await client.post("/tasks/", json=task_in.model_dump())
+        assert response.status_code == 201
+        task_ids.append(response.json()["task_id"])
+    not_existing_task_id: int = max(task_ids) + 1
+
+    response = await client.get(
+        f"/tasks/?ids={','.join(map(str, task_ids[:3]))},{not_existing_task_id}"
+    )
+    assert response.status_code == 200
+    assert [task["id"] for task in response.json()["tasks"]] == task_ids[:3]
+    assert response.json()["missing"] == [not_existing_task_id]
+
+    response = await client.post(
+        "/tasks/batch-get/", json={"ids": task_ids + [not_existing_task_id]}
+    )
+    assert response.status_code == 200
+    assert [task["id"] for task in response.json()["tasks"]] == task_ids
+    assert response.json()["missing"] == [not_existing_task_id]
+
+    response = await client.get("/tasks/?ids=1,invalid")
+    assert response.status_code == 400
+
+    # The tasks by ids are sent only as JSON and only by ids.
+    response = await client.get(
+        f"/tasks/?ids={task_ids[0]}", headers={"Accept": formats.MSGPACK}
+    )
+    assert response.status_code == 406
+    response = await client.get(f"/tasks/?ids={task_ids[0]}&status=todo")
+    assert response.status_code == 400
+
+    # The ids out of the range of BIGINT and too long lists are rejected.
+    too_big_id: int = MAX_TASK_ID + 1
+    response = await client.get(f"/tasks/?ids={too_big_id}")
+    assert response.status_code == 400
+    response = await client.get(
+        f"/tasks/?ids={','.join(['1'] * (MAX_QUERY_TASK_IDS + 1))}"
+    )
+    assert response.status_code == 400
+    response = await client.post("/tasks/batch-get/", json={"ids": [too_big_id]})
+    assert response.status_code == 422
+    # The body takes lists too long for the query string.
+    long_ids: List[int] = list(range(1, MAX_QUERY_TASK_IDS * 4))
+    response = await client.post("/tasks/batch-get/", json={"ids": long_ids})
+    assert response.status_code == 200
+    assert len(response.json()["tasks"]) + len(response.json()["missing"]) == len(
+        long_ids
+    )
+    response = await client.post(
+        "/tasks/batch-get/", json={"ids": [1] * (MAX_BATCH_TASK_IDS + 1)}
+    )
+    assert response.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_get_task_by_id(client: AsyncClient, task_in: TaskInSchema):
     """Test the endpoint GET /tasks/{idx}/."""
     not_existing_task_id: int = 1000
     response = await client.get(f"/tasks/{not_existing_task_id}/")
     assert response.status_code == 404
+    response = await client.get(f"/tasks/{MAX_TASK_ID + 1}/")
+    assert response.status_code == 422
 
     response = await client.post("/tasks/", json=task_in.model_dump())
     assert response.status_code == 201
@@ -104,6 +246,12 @@ async def test_get_task_by_id(client: AsyncClient, task_in: TaskInSchema):
     response = await client.get(f"/tasks/{task_id}/")
     assert response.status_code == 200
 
+    response = await client.get(
+        f"/tasks/{task_id}/", headers={"Accept": formats.MSGPACK}
+    )
+    assert response.status_code == 200
+    assert msgpack.unpackb(response.content)["id"] == task_id
+
 
 @pytest.mark.asyncio
 async def test_update_task(
@@ -158,6 +306,11 @@ async def test_update_with_invalid_input_data(
     )
     assert response.status_code == 422
 
+    response = await client.put(
+        f"/tasks/{MAX_TASK_ID + 1}/", json=updated_task_in.model_dump()
+    )
+    assert response.status_code == 422
+
 
 @pytest.mark.asyncio
 async def test_delete_task(client: AsyncClient, task_in: TaskInSchema):
@@ -176,3 +329,28 @@ async def test_delete_not_existing_task(client: AsyncClient):
     not_existing_task_id: int = 1000
     response = await client.delete(f"/tasks/{not_existing_task_id}/")
     assert response.status_code == 404
+    response = await client.delete(f"/tasks/{MAX_TASK_ID + 1}/")
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_sql_budgets(client: AsyncClient, many_task_in: List[TaskInSchema]):
+    """Test the number of SQL statements executed by the endpoints."""
+    with sql_budget(1):
+        response = await client.post(
+            "/tasks/bulk/", json=[task.model_dump() for task in many_task_in]
+        )
+    task_ids: List[int] = response.json()["task_ids"]
+
+    with sql_budget(1):
+        await client.get("/tasks/")
+    with sql_budget(1):
+        await client.get("/tasks/?status=todo&include_archived=true")
+    with sql_budget(1):
+        await client.get(f"/tasks/?ids={','.join(map(str, task_ids))}")
+    with sql_budget(1):
+        await client.get(f"/tasks/{task_ids[0]}/")
+    with sql_budget(2):
+        await client.put(f"/tasks/{task_ids[0]}/", json=many_task_in[0].model_dump())
+    with sql_budget(2):
+        await client.delete(f"/tasks/{task_ids[0]}/")
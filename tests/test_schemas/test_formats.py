@@ -0,0 +1,93 @@
+"""The module responsible for testing encoding and decoding of tasks."""
+
+import csv
+from typing import List
+
+import pytest
+
+from src.schemas import formats
+from src.schemas.schemas import TaskOutSchema
+
+
+@pytest.fixture
+def tasks_out() -> List[TaskOutSchema]:
+    """Return the list of tasks with characters that have to be escaped."""
+    return [
+        TaskOutSchema(
+            id=idx, title=f"Title, {idx}", description='"Description"\n', status="todo"
+        )
+        for idx in range(1, 4)
+    ]
+
+
+@pytest.mark.parametrize(
+    "accept,expected",
+    [
+        (None, formats.JSON),
+        ("*/*", formats.JSON),
+        ("text/html,application/xhtml+xml,*/*;q=0.8", formats.JSON),
+        ("application/x-msgpack", formats.MSGPACK),
+        ("application/json;q=0.5, text/csv", formats.CSV),
+        ("application/vnd.columns+json", formats.COLUMNS_JSON),
+        ("image/png", None),
+        ("application/json;q=0", None),
+        ("application/json;q=0, */*", formats.MSGPACK),
+        ("text/csv;q=0, text/*", None),
+    ],
+)
+def test_negotiate(accept: str, expected: str) -> None:
+    """Test choosing the media type by the Accept header."""
+    assert formats.negotiate(accept) == expected
+
+
+def test_negotiate_media_types() -> None:
+    """Test choosing the media type among the ones of the endpoint."""
+    assert formats.negotiate("application/msgpack", (formats.JSON,)) is None
+    assert formats.negotiate("text/csv, */*;q=0.1", (formats.JSON,)) == formats.JSON
+
+
+@pytest.mark.parametrize("media_type", formats.MEDIA_TYPES)
+def test_encode_decode_tasks(media_type: str, tasks_out: List[TaskOutSchema]) -> None:
+    """Test that the encoded tasks are decoded back."""
+    decoded = formats.decode_tasks(
+        formats.encode_tasks(tasks_out, media_type), media_type
+    )
+
+    assert len(decoded) == len(tasks_out)
+    for row, task in zip(decoded, tasks_out):
+        assert {key: str(value) for key, value in row.items()} == {
+            key: str(value) for key, value in task.model_dump().items()
+        }
+
+
+def test_encode_columns(tasks_out: List[TaskOutSchema]) -> None:
+    """Test the column-oriented form."""
+    encoded: bytes = formats.encode_tasks(tasks_out, formats.COLUMNS_JSON)
+    assert encoded.startswith(b'{"id": [1, 2, 3]')
+
+
+@pytest.mark.parametrize(
+    "body,content_type",
+    [
+        (b"[{", formats.JSON),
+        (b'{"title": "Title"}', formats.JSON),
+        (b"\xc1", formats.MSGPACK),
+        (b'{"id": 1}', formats.COLUMNS_JSON),
+        (b'[{"title": "Title"}]', formats.COLUMNS_JSON),
+        (
+            b'{"title": ["a", "b"], "description": ["x"], "status": ["todo", "todo"]}',
+            formats.COLUMNS_JSON,
+        ),
+        (b"title,description,status\na,b,todo,extra\n", formats.CSV),
+        pytest.param(
+            b"title,description,status\n" + b"a" * (csv.field_size_limit() + 1),
+            formats.CSV,
+            id="csv-field-too-large",
+        ),
+        (b"[]", "application/xml"),
+    ],
+)
+def test_decode_invalid_tasks(body: bytes, content_type: str) -> None:
+    """Test that malformed bodies and unknown formats raise ValueError."""
+    with pytest.raises(ValueError):
+        formats.decode_tasks(body, content_type)
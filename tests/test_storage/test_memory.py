@@ -0,0 +1,101 @@
+"""The module responsible for testing the in-memory storage backend."""
+
+import os
+from typing import Any, Dict, List
+
+import pytest
+
+from src.schemas.schemas import TaskInSchema, TaskOutSchema
+from src.storage.memory import (
+    LOG_FILE,
+    OLD_LOG_FILE,
+    MemoryStorageBackend,
+    MemoryTaskStorage,
+)
+
+
+@pytest.mark.asyncio
+async def test_memory_storage(
+    many_task_in: List[TaskInSchema], updated_task_in: TaskInSchema
+) -> None:
+    """Test that the tasks and the index by status stay ordered by id."""
+    storage = MemoryTaskStorage()
+    task_ids: List[int] = await storage.create_many(many_task_in)
+    assert task_ids == list(range(1, len(many_task_in) + 1))
+
+    await storage.update(task_ids[0], updated_task_in)
+    await storage.delete(task_ids[-1])
+    with pytest.raises(ValueError):
+        await storage.delete(task_ids[-1])
+
+    expected: Dict[int, TaskInSchema] = dict(zip(task_ids[:-1], many_task_in))
+    expected[task_ids[0]] = updated_task_in
+    for status in {task.status for task in expected.values()}:
+        tasks: List[TaskOutSchema] = await storage.get_all_by_status(status)
+        assert [task.id for task in tasks] == [
+            idx for idx, task in expected.items() if task.status == status
+        ]
+        assert await storage.count(status) == len(tasks)
+
+    tasks, missing = await storage.get_many([task_ids[-1], task_ids[0]])
+    assert tasks == [TaskOutSchema(id=task_ids[0], **updated_task_in.model_dump())]
+    assert missing == [task_ids[-1]]
+
+    rows: List[Dict[str, Any]] = []
+    async for batch in storage.iter_batches(None, 7):
+        assert len(batch) <= 7
+        rows.extend(batch)
+    assert [row["id"] for row in rows] == list(expected)
+
+
+@pytest.mark.asyncio
+async def test_memory_persistence(
+    tmp_path, many_task_in: List[TaskInSchema], updated_task_in: TaskInSchema
+) -> None:
+    """Test that the tasks are restored from the snapshot and the log."""
+    backend = MemoryStorageBackend(str(tmp_path), snapshot_every=5)
+    await backend.open()
+    task_ids: List[int] = await backend.tasks.create_many(many_task_in)
+    await backend.tasks.update(task_ids[0], updated_task_in)
+    await backend.tasks.delete(task_ids[-1])
+    expected: List[TaskOutSchema] = await backend.tasks.get_all()
+    await backend.tasks.wait_snapshot()
+
+    # The process is killed in the middle of writing an entry.
+    with open(os.path.join(tmp_path, LOG_FILE), "a") as file:
+        file.write('["put", 1000, "Torn')
+
+    restored = MemoryStorageBackend(str(tmp_path), snapshot_every=5)
+    await restored.open()
+    assert await restored.tasks.get_all() == expected
+    # The id of the deleted task is not given out again.
+    assert await restored.tasks.create(many_task_in[0]) == task_ids[-1] + 1
+    await restored.close()
+
+    reset = MemoryStorageBackend(str(tmp_path))
+    await reset.open(reset=True)
+    assert await reset.tasks.get_all() == []
+
+
+@pytest.mark.asyncio
+async def test_background_snapshot(tmp_path, many_task_in: List[TaskInSchema]) -> None:
+    """Test that the changes are logged while the snapshot is written in a thread."""
+    backend = MemoryStorageBackend(str(tmp_path), snapshot_every=5)
+    await backend.open()
+    task_ids: List[int] = await backend.tasks.create_many(many_task_in)
+    # The log is rotated, the snapshot is written when the loop is free.
+    assert os.path.exists(os.path.join(tmp_path, OLD_LOG_FILE))
+    task_ids.append(await backend.tasks.create(many_task_in[0]))
+
+    await backend.tasks.wait_snapshot()
+    assert not os.path.exists(os.path.join(tmp_path, OLD_LOG_FILE))
+
+    # The process is killed after the log is rotated, before the snapshot is saved.
+    assert backend.tasks.log is not None
+    backend.tasks.log.rotate()
+    task_ids.append(await backend.tasks.create(many_task_in[1]))
+
+    restored = MemoryStorageBackend(str(tmp_path), snapshot_every=5)
+    await restored.open()
+    assert [task.id for task in await restored.tasks.get_all()] == task_ids
+    await restored.close()